@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import metrics
+from pipeline import StoryTransformationPipeline
+from transformer import list_story_keys, list_world_keys
+
+
+def load_jobs(path):
+    """Read a JSONL job file: one {"story": ..., "world": ..., "output": optional} per line"""
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON ({e})")
+            if not job.get('story') or not job.get('world'):
+                raise ValueError(f"{path}:{line_no}: each job needs 'story' and 'world'")
+            jobs.append(job)
+    return jobs
+
+
+def all_jobs():
+    """Every story paired with every world"""
+    return [
+        {'story': story, 'world': world}
+        for story in list_story_keys()
+        for world in list_world_keys()
+    ]
+
+
+def job_output_base(job, output_dir):
+    name = job.get('output') or f"{job['story']}__{job['world']}"
+    return Path(output_dir) / name
+
+
+def run_batch(jobs, output_dir, write_result, concurrency=4, character_workers=2, verbose=True,
+              trace_path=None, prom_path=None, checkpoint=None, pipeline_options=None, store=None):
+    """Run jobs through a worker pool, writing each result as soon as it finishes
+
+    `write_result(result, output_base)` persists one result. Jobs whose
+    output_base.json already exists are skipped. With a result `store`,
+    results are appended there instead and jobs the store already holds
+    (for the same pipeline options) are skipped. Per-job metrics are
+    appended to `trace_path` (JSON lines) and aggregated into `prom_path`.
+    With a `checkpoint` store, a job that failed part-way resumes from its
+    finished stages the next time the batch runs. `pipeline_options` are
+    extra StoryTransformationPipeline keyword arguments for every job.
+    """
+    options = dict(pipeline_options or {})
+    if store is None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+    print_lock = threading.Lock()
+
+    def report(message):
+        if verbose:
+            with print_lock:
+                print(f"[Batch] {message}")
+
+    todo = []
+    skipped = 0
+    for job in jobs:
+        if store is not None:
+            done = store.has(job['story'], job['world'], options)
+        else:
+            done = job_output_base(job, output_dir).with_suffix('.json').exists()
+        if done:
+            skipped += 1
+        else:
+            todo.append(job)
+    report(f"{len(todo)} jobs to run, {skipped} already done, concurrency {concurrency}")
+
+    latencies = []
+    failures = []
+    prom_totals = metrics.PrometheusAggregate() if prom_path else None
+    metrics_lock = threading.Lock()
+
+    def export_metrics(pipeline):
+        with metrics_lock:
+            if trace_path:
+                pipeline.metrics.write_jsonl(trace_path)
+            if prom_totals is not None:
+                prom_totals.add(pipeline.metrics)
+                metrics.write_prometheus(prom_path, prom_totals)
+
+    def run_job(job):
+        start = time.perf_counter()
+        output_base = job_output_base(job, output_dir)
+        pipeline = StoryTransformationPipeline(
+            story_key=job['story'],
+            world_key=job['world'],
+            verbose=False,
+            max_workers=character_workers,
+            run_id=f"batch-{output_base.name}",
+            checkpoint=checkpoint,
+            **options
+        )
+        if checkpoint is not None:
+            try:
+                saved_options = checkpoint.manifest(pipeline.run_id).get('options')
+            except ValueError:
+                saved_options = None
+            if saved_options and saved_options != pipeline.options():
+                # Left by a run of this job with other options; its stages don't apply.
+                checkpoint.discard(pipeline.run_id)
+        try:
+            result = pipeline.run()
+        finally:
+            export_metrics(pipeline)
+        if store is not None:
+            store.add(result, job['story'], job['world'], options)
+        else:
+            write_result(result, output_base)
+        if checkpoint is not None:
+            checkpoint.discard(pipeline.run_id)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(run_job, job): job for job in todo}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            label = f"{job['story']} x {job['world']}"
+            try:
+                latency = future.result()
+            except Exception as e:
+                failures.append({'job': job, 'error': str(e)})
+                report(f"[{done_count}/{len(todo)}] {label} failed: {e}")
+                continue
+            latencies.append(latency)
+            report(f"[{done_count}/{len(todo)}] {label} done in {latency:.1f}s")
+    wall = time.perf_counter() - started
+
+    return {
+        'total': len(jobs),
+        'completed': len(latencies),
+        'failed': len(failures),
+        'skipped': skipped,
+        'wall_seconds': round(wall, 2),
+        'jobs_per_minute': round(len(latencies) / wall * 60, 2) if wall > 0 else 0.0,
+        'latency_p50': round(metrics.percentile(latencies, 50), 2),
+        'latency_p95': round(metrics.percentile(latencies, 95), 2),
+        'latency_max': round(max(latencies, default=0.0), 2),
+        'failures': failures
+    }
+
+
+def print_summary(summary):
+    print("\nBATCH SUMMARY")
+    print(f"  Jobs: {summary['completed']} completed, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped (of {summary['total']})")
+    print(f"  Wall time: {summary['wall_seconds']:.1f}s")
+    print(f"  Throughput: {summary['jobs_per_minute']:.2f} jobs/min")
+    print(f"  Latency: p50 {summary['latency_p50']:.1f}s, p95 {summary['latency_p95']:.1f}s, "
+          f"max {summary['latency_max']:.1f}s")
+    for failure in summary['failures']:
+        job = failure['job']
+        print(f"  FAILED {job['story']} x {job['world']}: {failure['error']}")
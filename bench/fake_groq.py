@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Local stand-in for Groq's chat-completions endpoint, for offline benchmarks
+
+Point llm_client at it with init_client(base_url=server.url) or GROQ_BASE_URL.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+FILLER_WORDS = (
+    "the city hums while old loyalties fray and a quiet promise holds "
+    "between two people who cannot afford to be seen together as the "
+    "feud grows louder and every message carries a cost"
+).split()
+
+
+class LatencyModel:
+    """Base response latency in seconds
+
+    Spec strings: "fixed:0.3", "uniform:0.1,0.5", "normal:0.3,0.05",
+    "lognormal:0.3,0.5" (median, sigma).
+    """
+
+    def __init__(self, spec="fixed:0.2"):
+        kind, _, params = spec.partition(':')
+        self.kind = kind
+        self.params = [float(p) for p in params.split(',') if p]
+        if kind not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+        self.spec = spec
+
+    def sample(self, rng):
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == 'normal':
+            return max(0.0, rng.gauss(self.params[0], self.params[1]))
+        return rng.lognormvariate(math.log(self.params[0]), self.params[1])
+
+
+class FakeGroqConfig:
+    def __init__(self, latency="fixed:0.2", tokens_per_second=800.0, completion_tokens=400,
+                 rate_limit_probability=0.0, retry_after=1.0, seed=None):
+        self.latency = LatencyModel(latency) if isinstance(latency, str) else latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.seed = seed
+
+    def as_dict(self):
+        return {
+            'latency': self.latency.spec,
+            'tokens_per_second': self.tokens_per_second,
+            'completion_tokens': self.completion_tokens,
+            'rate_limit_probability': self.rate_limit_probability,
+            'retry_after': self.retry_after,
+            'seed': self.seed
+        }
+
+
+def fake_completion_text(prompt, n_tokens):
+    # Roughly one token per word; enough structure for downstream parsing.
+    words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(max(1, n_tokens - 12))]
+    return "- New name: Ada Rook\n- New position: night-shift engineer\n" + " ".join(words)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': {'message': 'invalid JSON'}})
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+
+        with server.lock:
+            server.stats['requests'] += 1
+            throttled = server.rng.random() < server.config.rate_limit_probability
+            base_latency = server.config.latency.sample(server.rng)
+            if throttled:
+                server.stats['rate_limited'] += 1
+
+        if throttled:
+            return self._send_json(
+                429, {'error': {'message': 'Rate limit reached', 'type': 'tokens'}},
+                headers={'retry-after': str(server.config.retry_after)}
+            )
+
+        prompt = " ".join(m.get('content', '') for m in body.get('messages', []))
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = min(body.get('max_tokens') or server.config.completion_tokens,
+                                server.config.completion_tokens)
+        generation_time = completion_tokens / server.config.tokens_per_second
+        text = fake_completion_text(prompt, completion_tokens)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+        model = body.get('model', 'fake-model')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        time.sleep(base_latency)
+        if body.get('stream'):
+            with server.lock:
+                server.stats['streams'] += 1
+            return self._stream(completion_id, model, text, usage, generation_time)
+
+        time.sleep(generation_time)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': text},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, payload):
+        data = f"data: {payload}\n\n".encode('utf-8')
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, completion_id, model, text, usage, generation_time):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        words = text.split(' ')
+        delay = generation_time / max(1, len(words))
+        for i, word in enumerate(words):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': word if i == 0 else ' ' + word},
+                    'finish_reason': None
+                }]
+            }
+            self._write_chunk(json.dumps(chunk))
+            time.sleep(delay)
+
+        final = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            'x_groq': {'id': completion_id, 'usage': usage}
+        }
+        self._write_chunk(json.dumps(final))
+        self._write_chunk('[DONE]')
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeGroqServer:
+    """Threaded fake server; use as a context manager or call start()/stop()"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or FakeGroqConfig()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self.httpd.lock = threading.Lock()
+        self.httpd.rng = random.Random(self.config.seed)
+        self.httpd.stats = {'requests': 0, 'rate_limited': 0, 'streams': 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        with self.httpd.lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Groq chat-completions server")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', default='lognormal:0.3,0.4', help='fixed:S | uniform:A,B | normal:MU,SD | lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--tokens-per-second', type=float, default=800.0)
+    parser.add_argument('--completion-tokens', type=int, default=400)
+    parser.add_argument('--rate-limit-probability', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    config = FakeGroqConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    server = FakeGroqServer(config, port=args.port)
+    print(f"Fake Groq listening on {server.url} (set GROQ_BASE_URL to this)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Offline benchmarks for llm_client, a single pipeline run and batch runs
+
+Every scenario talks to bench/fake_groq.py, so no API key or network is needed.
+Results are saved as JSON under bench/results/ and can be compared against an
+earlier result file with --compare.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fake_groq import FakeGroqServer, FakeGroqConfig
+import llm_client
+from batch import run_batch, all_jobs
+from metrics import percentile
+from pipeline import StoryTransformationPipeline
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SCENARIOS = ('client', 'pipeline', 'batch')
+
+
+def latency_stats(latencies, wall):
+    return {
+        'count': len(latencies),
+        'p50': round(percentile(latencies, 50), 4),
+        'p95': round(percentile(latencies, 95), 4),
+        'p99': round(percentile(latencies, 99), 4),
+        'max': round(max(latencies, default=0.0), 4),
+        'wall_seconds': round(wall, 4),
+        'throughput_per_second': round(len(latencies) / wall, 4) if wall > 0 else 0.0
+    }
+
+
+def bench_client(args):
+    """Independent generate_structured calls from a thread pool"""
+    def one_call(i):
+        start = time.perf_counter()
+        llm_client.generate_structured(f"Benchmark prompt {i}: describe a character.", use_cache=False)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = list(executor.map(one_call, range(args.calls)))
+    return latency_stats(latencies, time.perf_counter() - started)
+
+
+def bench_pipeline(args):
+    """Sequential full StoryTransformationPipeline.run() calls"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        StoryTransformationPipeline(args.story, args.world, verbose=False,
+                                    max_workers=args.workers).run()
+        latencies.append(time.perf_counter() - start)
+    return latency_stats(latencies, time.perf_counter() - started)
+
+
+def bench_batch(args):
+    """Every story x world through run_batch"""
+    jobs = all_jobs()
+    with tempfile.TemporaryDirectory() as output_dir:
+        def write_result(result, output_base):
+            with open(f"{output_base}.json", 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+
+        summary = run_batch(jobs, output_dir, write_result, concurrency=args.concurrency,
+                            character_workers=args.workers, verbose=False)
+    return {
+        'count': summary['completed'],
+        'failed': summary['failed'],
+        'p50': summary['latency_p50'],
+        'p95': summary['latency_p95'],
+        'max': summary['latency_max'],
+        'wall_seconds': summary['wall_seconds'],
+        'throughput_per_second': round(summary['jobs_per_minute'] / 60, 4)
+    }
+
+
+BENCHMARKS = {'client': bench_client, 'pipeline': bench_pipeline, 'batch': bench_batch}
+
+# Lower is better for latencies, higher is better for throughput
+COMPARED_METRICS = {'p50': -1, 'p95': -1, 'p99': -1, 'throughput_per_second': 1}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """Print metric deltas; return the list of regressions beyond threshold"""
+    regressions = []
+    print("\nCOMPARISON vs", baseline.get('commit') or baseline.get('timestamp'))
+    for scenario, stats in current['results'].items():
+        base = baseline.get('results', {}).get(scenario)
+        if not base:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            if metric not in stats or not base.get(metric):
+                continue
+            change = (stats[metric] - base[metric]) / base[metric]
+            worse = change * direction < -threshold
+            flag = "  REGRESSION" if worse else ""
+            print(f"  {scenario:9s} {metric:22s} {base[metric]:>10} -> {stats[metric]:>10} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append((scenario, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local fake Groq server")
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--latency', default='lognormal:0.2,0.4', help='Fake server latency distribution')
+    parser.add_argument('--tokens-per-second', type=float, default=2000.0)
+    parser.add_argument('--completion-tokens', type=int, default=300)
+    parser.add_argument('--rate-limit-probability', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--calls', type=int, default=50, help='Calls for the client scenario')
+    parser.add_argument('--runs', type=int, default=5, help='Runs for the pipeline scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4, help='Character workers per pipeline')
+    parser.add_argument('--story', default='romeo_and_juliet')
+    parser.add_argument('--world', default='silicon_valley_tech')
+    parser.add_argument('--rpm', type=int, default=0, help='Client requests-per-minute budget (0 = off)')
+    parser.add_argument('--tpm', type=int, default=0, help='Client tokens-per-minute budget (0 = off)')
+    parser.add_argument('--save', type=str, help='Result file (default bench/results/<timestamp>.json)')
+    parser.add_argument('--compare', type=str, help='Earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change counted as a regression')
+    args = parser.parse_args()
+
+    config = FakeGroqConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+
+    results = {}
+    with FakeGroqServer(config) as server:
+        llm_client.init_client(api_key='bench', base_url=server.url)
+        llm_client.configure_cache(enabled=False)
+        llm_client.configure_rate_limit(args.rpm, args.tpm)
+        for scenario in scenarios:
+            print(f"Running {scenario} benchmark...")
+            results[scenario] = BENCHMARKS[scenario](args)
+            stats = results[scenario]
+            print(f"  p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s  "
+                  f"p99 {stats.get('p99', stats['max']):.3f}s  "
+                  f"{stats['throughput_per_second']:.2f}/s")
+        server_stats = server.stats
+        llm_client.close_client()
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'fake_server': config.as_dict(),
+        'server_stats': server_stats,
+        'options': {k: v for k, v in vars(args).items() if k not in ('save', 'compare')},
+        'results': results
+    }
+
+    save_path = Path(args.save) if args.save else (
+        RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(save_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {save_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
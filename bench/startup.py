@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark for run.py
+
+Runs cheap commands (--list, --help, an invalid key, --results) in fresh
+interpreters and reports median wall time, the import time of run.py and
+whether any heavy SDK modules were loaded. Exits non-zero when the import
+time exceeds --import-budget-ms or a command that never calls the API
+imports one of the heavy modules.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUN = str(ROOT / "run.py")
+
+# Modules that only an actual LLM call should need
+HEAVY_MODULES = ('groq', 'httpx', 'pydantic', 'dotenv', 'asyncio')
+
+
+def command_cases(store_path):
+    return {
+        'list': ['--list'],
+        'help': ['--help'],
+        'invalid_key': ['--story', 'no_such_story', '--world', 'no_such_world'],
+        'results': ['--results', '--store', store_path],
+    }
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from `python -X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def time_command(args, repeat):
+    walls = []
+    modules = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', RUN] + args,
+                              cwd=ROOT, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        modules = parse_importtime(proc.stderr)
+    heavy = sorted({
+        name.split('.')[0] for name in modules
+        if name.split('.')[0] in HEAVY_MODULES
+    })
+    return {
+        'wall_ms_median': round(statistics.median(walls) * 1000, 1),
+        'wall_ms_min': round(min(walls) * 1000, 1),
+        'heavy_modules': heavy
+    }
+
+
+def run_import_ms(repeat):
+    """Median cumulative import time of the run module itself"""
+    samples = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import run'],
+                              cwd=ROOT, capture_output=True, text=True)
+        samples.append(parse_importtime(proc.stderr).get('run', 0) / 1000)
+    return round(statistics.median(samples), 1)
+
+
+def interpreter_ms(repeat):
+    walls = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], capture_output=True)
+        walls.append(time.perf_counter() - start)
+    return round(statistics.median(walls) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure run.py startup time")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--import-budget-ms', type=float, default=60.0,
+                        help='Fail when importing run.py takes longer than this')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = command_cases(str(Path(tmp) / "results.db"))
+        report = {
+            'python_startup_ms': interpreter_ms(args.repeat),
+            'run_import_ms': run_import_ms(args.repeat),
+            'import_budget_ms': args.import_budget_ms,
+            'commands': {name: time_command(cmd, args.repeat) for name, cmd in cases.items()}
+        }
+
+    failures = []
+    if report['run_import_ms'] > args.import_budget_ms:
+        failures.append(f"importing run.py took {report['run_import_ms']}ms "
+                        f"(budget {args.import_budget_ms}ms)")
+    for name, stats in report['commands'].items():
+        if stats['heavy_modules']:
+            failures.append(f"'{name}' imported {', '.join(stats['heavy_modules'])}")
+    report['failures'] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Python startup:   {report['python_startup_ms']}ms")
+        print(f"import run:       {report['run_import_ms']}ms (budget {args.import_budget_ms}ms)")
+        for name, stats in report['commands'].items():
+            heavy = ', '.join(stats['heavy_modules']) or 'none'
+            print(f"  {name:12s} median {stats['wall_ms_median']:>7}ms  "
+                  f"min {stats['wall_ms_min']:>7}ms  heavy imports: {heavy}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
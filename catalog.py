@@ -0,0 +1,189 @@
+import json
+import mmap
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from checkpoint import write_atomic
+
+
+DATA_DIR = Path(__file__).parent / "data"
+INDEX_VERSION = 1
+
+STORY_SUMMARY_FIELDS = ('title', 'author', 'core_themes')
+WORLD_SUMMARY_FIELDS = ('name', 'era', 'aesthetic')
+
+
+class Catalog:
+    """Key index over a top-level JSON object; records are decoded lazily
+
+    The index maps each key to the byte offset and length of its record plus
+    a few summary fields for listing. It is built once per file version and
+    kept in a hidden sidecar next to the data, so later processes only read
+    the index and memory-map the data file.
+    """
+
+    def __init__(self, path, summary_fields=(), cache_size=256):
+        self.path = Path(path)
+        self.summary_fields = tuple(summary_fields)
+        self.cache_size = cache_size
+        self._index = None
+        self._mmap = None
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self):
+        return self.path.with_name(f".{self.path.name}.idx")
+
+    def _ensure_index(self):
+        if self._index is not None:
+            return self._index
+        with self._lock:
+            if self._index is None:
+                stat = self.path.stat()
+                signature = {
+                    'version': INDEX_VERSION,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'summary_fields': list(self.summary_fields)
+                }
+                index = self._read_sidecar(signature)
+                if index is None:
+                    index = self._build_index()
+                    self._write_sidecar(signature, index)
+                self._index = index
+        return self._index
+
+    def _read_sidecar(self, signature):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get('signature') != signature:
+            return None
+        return {key: tuple(entry) for key, entry in stored['entries']}
+
+    def _write_sidecar(self, signature, index):
+        payload = {
+            'signature': signature,
+            'entries': [[key, list(entry)] for key, entry in index.items()]
+        }
+        # A read-only data directory just means the index is rebuilt next time.
+        try:
+            write_atomic(self.index_path, lambda f: json.dump(payload, f, ensure_ascii=False), mode=0o644)
+        except OSError:
+            pass
+
+    def _build_index(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # Latin-1 maps every byte to one character, so string positions are
+        # byte offsets; JSON structure is ASCII and scans the same either way.
+        text = data.decode('latin-1')
+        decoder = json.JSONDecoder()
+        index = {}
+
+        pos = _skip_ws(text, 0)
+        if text[pos:pos + 1] != '{':
+            raise ValueError(f"{self.path} must contain a JSON object")
+        pos = _skip_ws(text, pos + 1)
+        if text[pos:pos + 1] == '}':
+            return index
+
+        while True:
+            _, key_end = decoder.raw_decode(text, pos)
+            key = json.loads(data[pos:key_end].decode('utf-8'))
+            pos = _skip_ws(text, key_end)
+            if text[pos:pos + 1] != ':':
+                raise ValueError(f"{self.path}: expected ':' at byte {pos}")
+            start = _skip_ws(text, pos + 1)
+            _, end = decoder.raw_decode(text, start)
+
+            summary = None
+            if self.summary_fields:
+                record = json.loads(data[start:end].decode('utf-8'))
+                summary = {field: record.get(field) for field in self.summary_fields}
+            index[key] = (start, end - start, summary)
+
+            pos = _skip_ws(text, end)
+            if text[pos:pos + 1] == ',':
+                pos = _skip_ws(text, pos + 1)
+                continue
+            if text[pos:pos + 1] == '}':
+                return index
+            raise ValueError(f"{self.path}: expected ',' or '}}' at byte {pos}")
+
+    def _map(self):
+        if self._mmap is None:
+            with self._lock:
+                if self._mmap is None:
+                    with open(self.path, 'rb') as f:
+                        self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def __contains__(self, key):
+        return key in self._ensure_index()
+
+    def __len__(self):
+        return len(self._ensure_index())
+
+    def keys(self):
+        return list(self._ensure_index())
+
+    def summaries(self):
+        """(key, summary) pairs from the index, without decoding any record"""
+        return [(key, entry[2]) for key, entry in self._ensure_index().items()]
+
+    def get(self, key):
+        """Decode one record; records are shared between callers and must not be mutated"""
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                self._records.move_to_end(key)
+                return record
+
+        offset, length, _ = self._ensure_index()[key]
+        record = json.loads(self._map()[offset:offset + length].decode('utf-8'))
+
+        with self._lock:
+            self._records[key] = record
+            if len(self._records) > self.cache_size:
+                self._records.popitem(last=False)
+        return record
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._records.clear()
+            self._index = None
+
+
+def _skip_ws(text, pos):
+    while pos < len(text) and text[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def _get_catalog(filename, summary_fields):
+    with _catalogs_lock:
+        catalog = _catalogs.get(filename)
+        if catalog is None:
+            catalog = Catalog(DATA_DIR / filename, summary_fields)
+            _catalogs[filename] = catalog
+        return catalog
+
+
+def stories():
+    return _get_catalog("stories.json", STORY_SUMMARY_FIELDS)
+
+
+def worlds():
+    return _get_catalog("worlds.json", WORLD_SUMMARY_FIELDS)
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+
+DEFAULT_CHECKPOINT_DIR = Path(__file__).parent / ".checkpoints"
+
+# Runs that failed and were never resumed are pruned after this long
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+def write_atomic(path, write, binary=False, fsync=False, mode=None):
+    """Call write(f) on a temp file next to `path`, then rename it over `path`
+
+    Readers see either the old file or the complete new one. The rename
+    replaces the file, so anything appended to the old one meanwhile by
+    another writer is lost; callers that append must lock around this.
+    `mode` sets the permissions (mkstemp creates 0600 files).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+            write(f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_json_atomic(path, payload):
+    """Write JSON so readers see either the old file or the complete new one"""
+    write_atomic(path, lambda f: json.dump(payload, f, ensure_ascii=False), fsync=True)
+
+
+class CheckpointStore:
+    """Per-run directory holding a manifest plus one file per finished stage output"""
+
+    def __init__(self, root=DEFAULT_CHECKPOINT_DIR):
+        self.root = Path(root)
+
+    def run_dir(self, run_id):
+        return self.root / run_id
+
+    def create(self, run_id, story_key, world_key, options=None):
+        manifest_path = self.run_dir(run_id) / "manifest.json"
+        if manifest_path.exists():
+            return self.manifest(run_id)
+        manifest = {
+            'run_id': run_id,
+            'story_key': story_key,
+            'world_key': world_key,
+            'options': options or {},
+            'created': time.time()
+        }
+        write_json_atomic(manifest_path, manifest)
+        return manifest
+
+    def manifest(self, run_id):
+        try:
+            with open(self.run_dir(run_id) / "manifest.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"No checkpoint found for run '{run_id}' in {self.root}")
+
+    def save(self, run_id, name, value):
+        write_json_atomic(self.run_dir(run_id) / f"{name}.json", {
+            'name': name,
+            'saved': time.time(),
+            'value': value
+        })
+
+    def load(self, run_id):
+        """Saved outputs for a run, keyed by output name"""
+        outputs = {}
+        directory = self.run_dir(run_id)
+        if not directory.exists():
+            return outputs
+        for path in directory.glob("*.json"):
+            if path.name == "manifest.json":
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                # A torn or unreadable file only means that stage runs again.
+                continue
+            outputs[entry['name']] = entry['value']
+        return outputs
+
+    def discard(self, run_id):
+        shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+
+    def list_runs(self):
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "manifest.json").exists())
+
+    def prune(self, max_age=DEFAULT_MAX_AGE):
+        """Discard runs created more than max_age seconds ago; returns their IDs"""
+        cutoff = time.time() - max_age
+        pruned = []
+        for run_id in self.list_runs():
+            try:
+                created = self.manifest(run_id).get('created', 0)
+            except (OSError, ValueError):
+                continue
+            if created < cutoff:
+                self.discard(run_id)
+                pruned.append(run_id)
+        return pruned
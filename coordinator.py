@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""Request/token budget shared by every process on the host, kept in SQLite
+
+Each process that calls the API opens the same coordinator file and uses a
+SharedRateLimiter in place of the in-process RateLimiter. A request waits
+in a queue of tickets; the ticket at the head gets the budget first:
+
+    1. higher priority first (interactive runs jump ahead of batch matrices)
+    2. within a priority, the process that used the least budget recently
+    3. then first come, first served
+
+Priority takes effect between requests: a request that is already running
+is never interrupted.
+
+    python coordinator.py --status [PATH]
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+DEFAULT_COORDINATOR_PATH = Path(__file__).parent / ".coordinator.db"
+
+DEFAULT_PRIORITY = 0
+INTERACTIVE_PRIORITY = 10
+
+# How often a queued request re-checks the queue, and when a ticket whose
+# owner stopped checking (a killed process) is dropped
+POLL_SECONDS = 0.05
+MAX_SLEEP = 0.25
+STALE_SECONDS = 5.0
+
+# Recent usage behind the fair share decays with this time constant
+USAGE_DECAY_SECONDS = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    capacity REAL NOT NULL,
+    refill REAL NOT NULL,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clients (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    usage REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
+    client TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    tokens REAL NOT NULL,
+    enqueued REAL NOT NULL,
+    seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def _now():
+    # Wall-clock time, since monotonic clocks are not comparable across processes
+    return time.time()
+
+
+def _decayed(usage, updated, now):
+    return usage * math.exp(-max(0.0, now - updated) / USAGE_DECAY_SECONDS)
+
+
+def _on_event_loop():
+    # Checked through sys.modules so sync-only processes never import asyncio.
+    asyncio = sys.modules.get('asyncio')
+    return asyncio is not None and asyncio._get_running_loop() is not None
+
+
+class SharedRateLimiter:
+    """Drop-in for RateLimiter whose budget and queue live in a SQLite file
+
+    A limit of 0 or None disables that budget. Every process sharing the
+    file should use the same limits; the last one to open it sets them.
+    """
+
+    def __init__(self, path=DEFAULT_COORDINATOR_PATH, requests_per_minute=None, tokens_per_minute=None,
+                 priority=DEFAULT_PRIORITY, client_id=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.priority = int(priority)
+        self.client_id = client_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+        self._wait_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        with self._transaction() as db:
+            now = _now()
+            for name, per_minute in (('requests', requests_per_minute), ('tokens', tokens_per_minute)):
+                capacity = float(per_minute or 0)
+                db.execute(
+                    "INSERT INTO buckets (name, capacity, refill, level, updated) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET capacity = excluded.capacity, refill = excluded.refill, "
+                    "level = MIN(level, excluded.capacity)",
+                    (name, capacity, capacity / 60.0, capacity, now)
+                )
+            db.execute(
+                "INSERT OR REPLACE INTO clients (id, priority, usage, updated) VALUES (?, ?, 0, ?)",
+                (self.client_id, self.priority, now)
+            )
+
+    def _transaction(self):
+        return _Transaction(self._db, self._lock)
+
+    def _enqueue(self, tokens):
+        now = _now()
+        with self._transaction() as db:
+            return db.execute(
+                "INSERT INTO tickets (client, priority, tokens, enqueued, seen) VALUES (?, ?, ?, ?, ?)",
+                (self.client_id, self.priority, tokens, now, now)
+            ).lastrowid
+
+    def _head(self, db, now):
+        db.execute("DELETE FROM tickets WHERE seen < ?", (now - STALE_SECONDS,))
+        rows = db.execute(
+            "SELECT t.id, t.priority, t.enqueued, c.usage, c.updated FROM tickets t "
+            "LEFT JOIN clients c ON c.id = t.client"
+        ).fetchall()
+        if not rows:
+            return None
+        return min(
+            rows,
+            key=lambda r: (-r[1], _decayed(r[3] or 0.0, r[4] or now, now), r[2], r[0])
+        )[0]
+
+    def _try_grant(self, ticket, tokens):
+        """Seconds still to wait, or 0.0 once the ticket got its budget"""
+        with self._transaction() as db:
+            now = _now()
+            db.execute("UPDATE tickets SET seen = ? WHERE id = ?", (now, ticket))
+            if self._head(db, now) != ticket:
+                return POLL_SECONDS
+
+            delay = 0.0
+            buckets = {}
+            for name, capacity, refill, level, updated in db.execute(
+                "SELECT name, capacity, refill, level, updated FROM buckets"
+            ).fetchall():
+                if not capacity:
+                    continue
+                level = min(capacity, level + max(0.0, now - updated) * refill)
+                amount = 1.0 if name == 'requests' else min(tokens, capacity)
+                buckets[name] = (level, amount)
+                if level < amount:
+                    delay = max(delay, (amount - level) / refill)
+            row = db.execute("SELECT value FROM state WHERE key = 'paused_until'").fetchone()
+            if row is not None:
+                delay = max(delay, row[0] - now)
+            if delay > 0:
+                return delay
+
+            for name, (level, amount) in buckets.items():
+                db.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?", (level - amount, now, name))
+            db.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+            usage, updated = db.execute(
+                "SELECT usage, updated FROM clients WHERE id = ?", (self.client_id,)
+            ).fetchone() or (0.0, now)
+            db.execute(
+                "INSERT OR REPLACE INTO clients (id, priority, usage, updated) VALUES (?, ?, ?, ?)",
+                (self.client_id, self.priority, _decayed(usage, updated, now) + 1.0 + tokens / 1000.0, now)
+            )
+            return 0.0
+
+    def _cancel(self, ticket):
+        with self._transaction() as db:
+            db.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+
+    def _write(self, fn, *args):
+        """Run a write that needs no answer; on an event loop it goes to a background thread
+
+        Every transaction can wait on another process's lock (and on threads
+        of this one), which must not stall the coroutines sharing the loop.
+        """
+        if not _on_event_loop():
+            fn(*args)
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="coordinator")
+            self._writer.submit(fn, *args)
+
+    def acquire(self, tokens=0):
+        """Block until this process's turn comes and the shared budget fits; returns seconds waited"""
+        start = time.perf_counter()
+        ticket = self._enqueue(tokens)
+        try:
+            while True:
+                delay = self._try_grant(ticket, tokens)
+                if delay <= 0:
+                    break
+                time.sleep(min(delay, MAX_SLEEP))
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        return self._waited(start)
+
+    async def aacquire(self, tokens=0):
+        """acquire() for coroutines: the SQLite transactions run on worker threads, not the loop"""
+        # Imported here so run.py can read this module's defaults without asyncio.
+        import asyncio
+        start = time.perf_counter()
+        ticket = await asyncio.to_thread(self._enqueue, tokens)
+        try:
+            while True:
+                delay = await asyncio.to_thread(self._try_grant, ticket, tokens)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(min(delay, MAX_SLEEP))
+        except BaseException:
+            self._write(self._cancel, ticket)
+            raise
+        return self._waited(start)
+
+    def _waited(self, start):
+        waited = time.perf_counter() - start
+        # A grant on the first try only paid for the SQLite round trip.
+        if waited < POLL_SECONDS:
+            return 0.0
+        with self._wait_lock:
+            self.total_wait += waited
+        return waited
+
+    def settle(self, reserved, used):
+        """Give back the difference between the reserved token estimate and actual usage"""
+        if reserved <= used:
+            return
+        self._write(self._settle, reserved, used)
+
+    def _settle(self, reserved, used):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE buckets SET level = MIN(capacity, level + ?) WHERE name = 'tokens' AND capacity > 0",
+                (reserved - used,)
+            )
+
+    def pause(self, seconds):
+        """Hold every process back for `seconds`, e.g. after a 429 with Retry-After"""
+        self._write(self._pause_until, _now() + seconds)
+
+    def _pause_until(self, until):
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO state (key, value) VALUES ('paused_until', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+                (until,)
+            )
+
+    def status(self):
+        return coordinator_status(self._db, self._lock)
+
+    def close(self):
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+        with self._transaction() as db:
+            db.execute("DELETE FROM tickets WHERE client = ?", (self.client_id,))
+        with self._lock:
+            self._db.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so the read-modify-write of a grant is atomic across processes"""
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+def coordinator_status(db, lock=None):
+    """Bucket levels, queued tickets per client and each client's recent usage"""
+    lock = lock or threading.Lock()
+    now = _now()
+    with lock:
+        buckets = db.execute("SELECT name, capacity, refill, level, updated FROM buckets").fetchall()
+        clients = db.execute("SELECT id, priority, usage, updated FROM clients").fetchall()
+        tickets = db.execute(
+            "SELECT client, COUNT(*), MIN(enqueued) FROM tickets WHERE seen >= ? GROUP BY client",
+            (now - STALE_SECONDS,)
+        ).fetchall()
+        paused = db.execute("SELECT value FROM state WHERE key = 'paused_until'").fetchone()
+    queued = {client: (count, oldest) for client, count, oldest in tickets}
+    return {
+        'buckets': {
+            name: {
+                'per_minute': capacity,
+                'available': round(min(capacity, level + max(0.0, now - updated) * refill), 1)
+            }
+            for name, capacity, refill, level, updated in buckets if capacity
+        },
+        'paused_for': round(max(0.0, paused[0] - now), 2) if paused else 0.0,
+        'clients': [
+            {
+                'client': client,
+                'priority': priority,
+                'recent_usage': round(_decayed(usage, updated, now), 2),
+                'queued': queued.get(client, (0, None))[0],
+                'oldest_wait': round(now - queued[client][1], 2) if client in queued else None
+            }
+            for client, priority, usage, updated in sorted(clients, key=lambda c: (-c[1], c[0]))
+            if client in queued or now - updated < USAGE_DECAY_SECONDS * 5
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the shared rate-limit coordinator")
+    parser.add_argument('path', nargs='?', default=str(DEFAULT_COORDINATOR_PATH))
+    parser.add_argument('--status', action='store_true', help='Print budget, queue and per-process usage (default)')
+    args = parser.parse_args()
+
+    if not Path(args.path).exists():
+        print(f"Error: no coordinator at {args.path}")
+        return
+    db = sqlite3.connect(args.path, timeout=30)
+    try:
+        print(json.dumps(coordinator_status(db), indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+
+from metrics import percentile
+
+
+# Stages whose calls are short and structured enough that a duplicate is cheap
+DEFAULT_STAGES = ('character', 'conflict', 'validation')
+
+# At most this fraction of eligible requests may send a hedge
+DEFAULT_MAX_RATE = 0.1
+
+# With threshold='p95', a stage is not hedged until this many latencies are known
+MIN_SAMPLES = 20
+WINDOW = 200
+
+# Never hedge sooner than this, whatever the percentile says
+MIN_DELAY = 0.05
+
+
+class HedgePolicy:
+    """Decides when a slow request gets a duplicate, and counts how often that paid off
+
+    `threshold` is either a number of seconds or a percentile name such as
+    'p95', computed from the recent latencies of the same stage.
+    """
+
+    def __init__(self, threshold='p95', max_rate=DEFAULT_MAX_RATE, stages=DEFAULT_STAGES,
+                 min_samples=MIN_SAMPLES, window=WINDOW):
+        self.percentile = None
+        self.fixed_delay = None
+        if isinstance(threshold, str):
+            if not threshold.startswith('p') or not threshold[1:].replace('.', '', 1).isdigit():
+                raise ValueError(f"Hedge threshold must be seconds or a percentile like 'p95', got '{threshold}'")
+            self.percentile = float(threshold[1:])
+        else:
+            self.fixed_delay = max(float(threshold), MIN_DELAY)
+        if not 0 < max_rate <= 1:
+            raise ValueError(f"Hedge max_rate must be in (0, 1], got {max_rate}")
+        self.threshold = threshold
+        self.max_rate = max_rate
+        self.stages = tuple(stages) if stages else None
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def applies_to(self, stage):
+        return self.stages is None or stage in self.stages
+
+    def _stage_stats(self, stage):
+        return self._stats.setdefault(stage, {'requests': 0, 'hedges_sent': 0, 'hedges_won': 0, 'hedges_denied': 0})
+
+    def observe(self, stage, seconds):
+        """Record how long a request of this stage took to answer"""
+        with self._lock:
+            self._latencies.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def delay_for(self, stage):
+        """Seconds to wait before hedging a request of this stage, or None to not hedge it"""
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        with self._lock:
+            samples = list(self._latencies.get(stage, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(percentile(samples, self.percentile), MIN_DELAY)
+
+    def start(self, stage):
+        """Count an eligible request; the hedge budget grows with it"""
+        with self._lock:
+            self._stage_stats(stage)['requests'] += 1
+
+    def allow_hedge(self, stage):
+        """True (and counted as sent) when one more hedge stays within max_rate overall"""
+        with self._lock:
+            requests = sum(s['requests'] for s in self._stats.values())
+            sent = sum(s['hedges_sent'] for s in self._stats.values())
+            stats = self._stage_stats(stage)
+            if sent + 1 > self.max_rate * requests:
+                stats['hedges_denied'] += 1
+                return False
+            stats['hedges_sent'] += 1
+            return True
+
+    def won(self, stage):
+        with self._lock:
+            self._stage_stats(stage)['hedges_won'] += 1
+
+    def stats(self):
+        """Per-stage and total request/hedge counters plus the current thresholds"""
+        with self._lock:
+            stages = {stage: dict(counts) for stage, counts in self._stats.items()}
+        totals = {'requests': 0, 'hedges_sent': 0, 'hedges_won': 0, 'hedges_denied': 0}
+        for stage, counts in stages.items():
+            for key in totals:
+                totals[key] += counts[key]
+            delay = self.delay_for(stage)
+            counts['threshold_seconds'] = round(delay, 4) if delay is not None else None
+        return {
+            'threshold': self.threshold,
+            'max_rate': self.max_rate,
+            'stages': stages,
+            'totals': totals
+        }
@@ -1,59 +1,934 @@
+import asyncio
+import atexit
+import contextvars
 import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from groq import Groq
-from dotenv import load_dotenv
+from response_cache import ResponseCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DEFAULT_MAX_AGE
+from rate_limiter import RateLimiter
+import metrics
+import routing
+import hedging
+from token_budget import estimate_tokens
 
 
-def get_client():
-    env_path = Path(__file__).parent / ".env"
-    load_dotenv(dotenv_path=env_path, override=True)
-    api_key = os.getenv("GROQ_API_KEY")
+MODEL = routing.DEFAULT_MODEL
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE = 10
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+# Groq's published free-tier limits for llama-3.1-8b-instant
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 6000
+
+# groq, httpx and dotenv are imported on first use: they take most of the
+# import time of this module, and commands like `run.py --list` never need them.
+_retryable = None
+
+_client = None
+_client_lock = threading.Lock()
+# Arguments of the last init_client(), reused by every client built after it
+_client_options = {}
+_env_loaded = False
+
+# Guards lazy creation of the limiter, router and cache: worker threads
+# reach them at the same time on the first calls of a run.
+_singleton_lock = threading.Lock()
+
+_limiter = None
+_coordinator = None
+_inflight = None
+_max_inflight = None
+
+# Async clients are bound to the event loop that created them: one per loop
+_async_states = weakref.WeakKeyDictionary()
+
+_router = None
+
+_hedger = None
+
+_cache = None
+_cache_enabled = os.getenv("STORY_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def _retryable_errors():
+    global _retryable
+    if _retryable is None:
+        from groq import RateLimitError, APIConnectionError, InternalServerError
+        _retryable = (RateLimitError, APIConnectionError, InternalServerError)
+    return _retryable
+
+
+def _is_rate_limit(error):
+    return isinstance(error, _retryable_errors()[0])
+
+
+def __getattr__(name):
+    # Keeps llm_client.RETRYABLE_ERRORS working without importing groq up front.
+    if name == "RETRYABLE_ERRORS":
+        return _retryable_errors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _load_env():
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        env_path = Path(__file__).parent / ".env"
+        load_dotenv(dotenv_path=env_path, override=True)
+        _env_loaded = True
+
+
+def _client_settings(api_key=None, max_connections=None, max_keepalive=None, keepalive_expiry=None,
+                     base_url=None):
+    import httpx
+    _load_env()
+    api_key = api_key or os.getenv("GROQ_API_KEY")
     if not api_key:
         raise ValueError(
             "Missing GROQ_API_KEY. Set it in your .env file or environment."
         )
-    return Groq(api_key=api_key)
 
+    limits = httpx.Limits(
+        max_connections=max_connections or int(
+            os.getenv("GROQ_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        max_keepalive_connections=max_keepalive or int(
+            os.getenv("GROQ_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE)),
+        keepalive_expiry=keepalive_expiry or float(
+            os.getenv("GROQ_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+    )
+    # base_url (or GROQ_BASE_URL) can point at a local stand-in such as bench/fake_groq.py.
+    return api_key, base_url or os.getenv("GROQ_BASE_URL") or None, limits
 
-def generate_text(prompt, system_message=None, temperature=0.7, max_tokens=1500):
-    client = get_client()
-    
+
+def _build_client(api_key=None, max_connections=None, max_keepalive=None, keepalive_expiry=None,
+                  base_url=None):
+    import httpx
+    from groq import Groq
+    api_key, base_url, limits = _client_settings(
+        api_key, max_connections, max_keepalive, keepalive_expiry, base_url)
+    # Retries are handled by generate_with_retry so they go through the rate limiter.
+    return Groq(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.Client(limits=limits),
+        max_retries=0
+    )
+
+
+def init_client(api_key=None, max_connections=None, max_keepalive=None, keepalive_expiry=None,
+                base_url=None):
+    """Create the shared Groq client, replacing (and closing) any existing one
+
+    The same settings are used for the async clients of event loops that
+    don't have one yet.
+    """
+    global _client, _client_options
+    options = {
+        'api_key': api_key,
+        'max_connections': max_connections,
+        'max_keepalive': max_keepalive,
+        'keepalive_expiry': keepalive_expiry,
+        'base_url': base_url
+    }
+    client = _build_client(**options)
+    with _client_lock:
+        previous, _client = _client, client
+        _client_options = options
+    if previous is not None:
+        previous.close()
+    return client
+
+
+def get_client():
+    # httpx clients are thread-safe, so one pooled client serves every
+    # thread and keeps its connections warm between calls.
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client(**_client_options)
+            client = _client
+    return client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def _reset_after_fork():
+    # The child must not reuse (or close) sockets inherited from the parent.
+    global _client, _client_lock
+    global _limiter, _singleton_lock
+    _client = None
+    _client_lock = threading.Lock()
+    _singleton_lock = threading.Lock()
+    _async_states.clear()
+    if _coordinator is not None:
+        # The SQLite connection can't cross a fork; the child opens its own.
+        _limiter = None
+
+
+atexit.register(close_client)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def configure_rate_limit(requests_per_minute=None, tokens_per_minute=None):
+    """Replace the shared limiter with an in-process one; a limit of 0 turns that budget off"""
+    global _limiter, _coordinator
+    _coordinator = None
+    _limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    return _limiter
+
+
+def _env_rate_limits():
+    return (
+        int(os.getenv("GROQ_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)),
+        int(os.getenv("GROQ_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE))
+    )
+
+
+def configure_coordinator(path=None, priority=None, requests_per_minute=None, tokens_per_minute=None):
+    """Share one rate budget and a fair-share queue with every process using the same file
+
+    Limits default to GROQ_REQUESTS_PER_MINUTE / GROQ_TOKENS_PER_MINUTE.
+    Higher priorities are served first; see coordinator.py.
+    """
+    global _limiter, _coordinator
+    import coordinator
+    env_requests, env_tokens = _env_rate_limits()
+    _coordinator = {
+        'path': path or coordinator.DEFAULT_COORDINATOR_PATH,
+        'requests_per_minute': env_requests if requests_per_minute is None else requests_per_minute,
+        'tokens_per_minute': env_tokens if tokens_per_minute is None else tokens_per_minute,
+        'priority': coordinator.DEFAULT_PRIORITY if priority is None else priority
+    }
+    _limiter = coordinator.SharedRateLimiter(**_coordinator)
+    return _limiter
+
+
+def get_rate_limiter():
+    global _limiter
+    limiter = _limiter
+    if limiter is None:
+        with _singleton_lock:
+            if _limiter is None:
+                if _coordinator is not None:
+                    import coordinator
+                    _limiter = coordinator.SharedRateLimiter(**_coordinator)
+                elif os.getenv("STORY_COORDINATOR"):
+                    configure_coordinator(os.getenv("STORY_COORDINATOR"), int(os.getenv("STORY_PRIORITY", "0")))
+                else:
+                    _limiter = RateLimiter(*_env_rate_limits())
+            limiter = _limiter
+    return limiter
+
+
+def configure_routing(routes=None):
+    """Replace the shared router; routes maps stage -> {primary, fallback, latency_slo}"""
+    global _router
+    _router = routing.Router(routes, default_model=MODEL)
+    return _router
+
+
+def get_router():
+    global _router
+    router = _router
+    if router is None:
+        with _singleton_lock:
+            if _router is None:
+                _router = routing.Router(routing.routes_from_env(), default_model=MODEL)
+            router = _router
+    return router
+
+
+def configure_hedging(threshold='p95', max_rate=hedging.DEFAULT_MAX_RATE, stages=hedging.DEFAULT_STAGES,
+                      enabled=True):
+    """Opt in to hedged requests: a slow call gets a duplicate and the first answer wins
+
+    threshold is seconds or a percentile of the stage's recent latency ('p95');
+    max_rate caps hedges as a fraction of eligible requests; stages=None hedges
+    every non-streaming call. enabled=False turns hedging off again.
+    """
+    global _hedger
+    _hedger = hedging.HedgePolicy(threshold, max_rate, stages) if enabled else None
+    return _hedger
+
+
+def hedge_stats():
+    """Requests, hedges sent/won/denied and current thresholds per stage, or None when off"""
+    return _hedger.stats() if _hedger is not None else None
+
+
+def _start_copy(fn, *args):
+    """Run fn(*args) on its own thread and return a Future for it
+
+    Not a shared pool: a fixed pool would cap every hedged stage below
+    max_workers / --max-inflight, and a slow loser would hold a slot.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="hedge", daemon=True).start()
+    return future
+
+
+def configure_concurrency(max_inflight=None):
+    """Cap the number of API requests in flight across all threads (None = no cap)
+
+    Async calls get the same cap per event loop.
+    """
+    global _inflight, _max_inflight
+    _max_inflight = max_inflight
+    _inflight = threading.BoundedSemaphore(max_inflight) if max_inflight else None
+
+
+def estimate_request_tokens(messages, max_tokens):
+    # Rough estimate; the difference is settled once the response reports
+    # its real usage.
+    return sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+
+
+def configure_cache(enabled=True, directory=None, max_bytes=None, max_age=None):
+    global _cache, _cache_enabled
+    _cache_enabled = enabled
+    _cache = None
+    if enabled and (directory or max_bytes or max_age):
+        _cache = ResponseCache(
+            directory=directory or DEFAULT_CACHE_DIR,
+            max_bytes=max_bytes or DEFAULT_MAX_BYTES,
+            max_age=max_age or DEFAULT_MAX_AGE
+        )
+    return _cache
+
+
+def get_cache():
+    global _cache
+    if not _cache_enabled:
+        return None
+    cache = _cache
+    if cache is None:
+        with _singleton_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    directory=os.getenv("STORY_CACHE_DIR") or DEFAULT_CACHE_DIR,
+                    max_bytes=int(float(os.getenv("STORY_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 2**20)) * 2**20),
+                    max_age=float(os.getenv("STORY_CACHE_MAX_AGE_HOURS", DEFAULT_MAX_AGE / 3600)) * 3600
+                )
+            cache = _cache
+    return cache
+
+
+def _build_request(prompt, system_message, temperature, max_tokens):
     messages = []
     if system_message:
         messages.append({"role": "system", "content": system_message})
     messages.append({"role": "user", "content": prompt})
-    
+
+    return {
+        "model": MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+
+
+def _new_call(request):
+    return {
+        'stage': metrics.current_stage(),
+        'route': metrics.current_route(),
+        'model': request['model'],
+        'started_at': time.time(),
+        'wall_seconds': 0.0,
+        'wait_seconds': 0.0,
+        'prompt_tokens': None,
+        'completion_tokens': None,
+        'retries': 0,
+        'cache_hit': False,
+        'error': None,
+        'hedges_sent': 0,
+        'hedges_won': 0,
+        'attempts': []
+    }
+
+
+def _finish_call(call, start, error=None):
+    call['wall_seconds'] = round(time.perf_counter() - start, 4)
+    call['wait_seconds'] = round(call['wait_seconds'], 4)
+    if error is not None:
+        call['error'] = f"{error.__class__.__name__}: {error}"
+    metrics.record_call(call)
+
+
+def _record_usage(call, usage):
+    if usage is not None:
+        call['prompt_tokens'] = usage.prompt_tokens
+        call['completion_tokens'] = usage.completion_tokens
+
+
+def _cache_lookup(request, use_cache, call):
+    """(cache, key, cached content) for a request; cache is None when not caching"""
+    cache = get_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    key = cache.make_key(request)
+    cached = cache.get(key)
+    if cached is not None:
+        call['cache_hit'] = True
+    return cache, key, cached
+
+
+def _cache_store(cache, key, content, request):
+    if cache is not None and content:
+        try:
+            cache.put(key, content, request)
+        except OSError as e:
+            print(f"Response cache write failed: {e}")
+
+
+def _settle_response(response, call, limiter, reserved):
+    usage = getattr(response, "usage", None)
+    _record_usage(call, usage)
+    if usage is not None and usage.total_tokens is not None:
+        limiter.settle(reserved, usage.total_tokens)
+    return response.choices[0].message.content
+
+
+def _timeout_kwargs(timeout):
+    return {"timeout": timeout} if timeout else {}
+
+
+def _send(request, call, timeout=None, on_send=None):
+    """Rate limit, then one API call; returns the message content"""
+    client = get_client()
+    limiter = get_rate_limiter()
+    reserved = estimate_request_tokens(request["messages"], request["max_tokens"])
+    call['wait_seconds'] += limiter.acquire(reserved)
+
+    inflight = _inflight
+    if inflight is not None:
+        queued = time.perf_counter()
+        inflight.acquire()
+        call['wait_seconds'] += time.perf_counter() - queued
+    if on_send is not None:
+        on_send()
     try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant", 
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-        return response.choices[0].message.content
-    
+        response = client.chat.completions.create(**request, **_timeout_kwargs(timeout))
     except Exception as e:
+        limiter.settle(reserved, 0)
         print(f"Groq API Error: {e}")
         raise
+    finally:
+        if inflight is not None:
+            inflight.release()
 
+    return _settle_response(response, call, limiter, reserved)
 
-def generate_with_retry(prompt, system_message=None, temperature=0.7, max_tokens=1500, retries=2):
-    last_error = None
-    
+
+def _hedge_scratch():
+    # Each copy of a hedged request keeps its own counters; the winner's are kept.
+    return {'wait_seconds': 0.0, 'prompt_tokens': None, 'completion_tokens': None}
+
+
+def _take_winner(hedger, call, scratch, hedged_copy, started):
+    call['wait_seconds'] += scratch['wait_seconds']
+    call['prompt_tokens'] = scratch['prompt_tokens']
+    call['completion_tokens'] = scratch['completion_tokens']
+    hedger.observe(call['route'], time.perf_counter() - started)
+    if hedged_copy:
+        call['hedges_won'] += 1
+        hedger.won(call['route'])
+
+
+def _hedged_send(hedger, request, call, timeout):
+    """_send(), plus a duplicate once the first copy is slower than the stage's threshold
+
+    A sync request cannot be interrupted, so the losing copy runs to
+    completion on its own thread and its answer is dropped.
+    """
+    stage = call['route']
+    hedger.start(stage)
+    copies = {}
+
+    def launch(on_send=None):
+        scratch = _hedge_scratch()
+        future = _start_copy(_send, dict(request), scratch, timeout, on_send)
+        copies[future] = scratch
+        return future
+
+    # The threshold is measured from when the request goes out, not from
+    # when it started queueing for the rate limiter.
+    sent = threading.Event()
+    primary = launch(sent.set)
+    primary.add_done_callback(lambda _: sent.set())
+    sent.wait()
+    started = time.perf_counter()
+
+    delay = hedger.delay_for(stage)
+    if delay is not None:
+        done, _ = wait([primary], timeout=delay)
+        if not done and hedger.allow_hedge(stage):
+            call['hedges_sent'] += 1
+            launch()
+
+    pending = set(copies)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+            for loser in pending:
+                loser.cancel()
+            _take_winner(hedger, call, copies[future], future is not primary, started)
+            return future.result()
+    raise error
+
+
+def _complete(request, use_cache, call, timeout=None):
+    """One attempt at a request: cache lookup, rate limit, then the API call"""
+    cache, key, cached = _cache_lookup(request, use_cache, call)
+    if cached is not None:
+        return cached
+
+    hedger = _hedger
+    if hedger is not None and hedger.applies_to(call['route']):
+        content = _hedged_send(hedger, request, call, timeout)
+    else:
+        content = _send(request, call, timeout)
+    _cache_store(cache, key, content, request)
+    return content
+
+
+def _failure_reason(error):
+    if error is None:
+        return 'ok'
+    from groq import APITimeoutError
+    if isinstance(error, APITimeoutError):
+        return 'timeout'
+    if _is_rate_limit(error):
+        return 'rate_limited'
+    return 'error'
+
+
+def _route_attempt(request, call, route):
+    """Point the request at the model the router picks for this attempt; returns (model, timeout)"""
+    model, timeout = get_router().choose(route)
+    request['model'] = model
+    call['model'] = model
+    return model, timeout
+
+
+def _end_attempt(call, route, model, started, waited_before, error=None):
+    """Record one attempt's model and latency; True when the next attempt should fail over"""
+    reason = 'cache' if call['cache_hit'] else _failure_reason(error)
+    # Time spent queued for the rate limiter is not the model's latency.
+    seconds = time.perf_counter() - started - (call['wait_seconds'] - waited_before)
+    call['attempts'].append({'model': model, 'seconds': round(max(seconds, 0.0), 4), 'outcome': reason})
+    if error is None:
+        return False
+    cooldown = retry_after_seconds(error) if reason == 'rate_limited' else None
+    if get_router().failover(route, model, reason, cooldown):
+        print(f"{model} {reason.replace('_', ' ')} in {route.stage}, failing over to {route.fallback}")
+        return True
+    return False
+
+
+def generate_text(prompt, system_message=None, temperature=0.7, max_tokens=1500, use_cache=False):
+    request = _build_request(prompt, system_message, temperature, max_tokens)
+    call = _new_call(request)
+    route = get_router().route_for(call['route'])
+    # A single attempt has nothing to fail over to, so no latency deadline.
+    model, _ = _route_attempt(request, call, route)
+    start = time.perf_counter()
+    try:
+        content = _complete(request, use_cache, call)
+    except Exception as e:
+        _end_attempt(call, route, model, start, 0.0, e)
+        _finish_call(call, start, e)
+        raise
+    _end_attempt(call, route, model, start, 0.0)
+    _finish_call(call, start)
+    return content
+
+
+def retry_after_seconds(error):
+    """Server-requested wait from a 429 response, or None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(error, attempt, base_delay, max_delay):
+    delay = retry_after_seconds(error) if _is_rate_limit(error) else None
+    if delay is not None:
+        # Everyone sharing the limiter waits, not just this caller.
+        get_rate_limiter().pause(delay)
+        return delay
+    # Exponential backoff with full jitter so parallel callers spread out.
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def _next_attempt(call, route, model, attempt_start, waited, error, attempt, retries, base_delay, max_delay,
+                  started):
+    """Record a failed attempt and decide on the next one
+
+    Returns None to go to the fallback right away, or the seconds to back
+    off first. Raises `error` once it isn't retryable or retries are used up.
+    """
+    failover = _end_attempt(call, route, model, attempt_start, waited, error)
+    if not isinstance(error, _retryable_errors()) or attempt >= retries:
+        _finish_call(call, started, error)
+        raise error
+    call['retries'] += 1
+    if failover:
+        # The fallback has its own quota, so there is no reason to wait.
+        return None
+    delay = _retry_delay(error, attempt, base_delay, max_delay)
+    print(f"Attempt {attempt + 1} failed ({error.__class__.__name__}), retrying in {delay:.1f}s...")
+    call['wait_seconds'] += delay
+    return delay
+
+
+def generate_with_retry(prompt, system_message=None, temperature=0.7, max_tokens=1500, retries=4,
+                        use_cache=False, base_delay=1.0, max_delay=30.0):
+    request = _build_request(prompt, system_message, temperature, max_tokens)
+    call = _new_call(request)
+    route = get_router().route_for(call['route'])
+    start = time.perf_counter()
+
+    for attempt in range(retries + 1):
+        model, timeout = _route_attempt(request, call, route)
+        attempt_start, waited = time.perf_counter(), call['wait_seconds']
+        try:
+            content = _complete(request, use_cache, call, timeout)
+        except Exception as e:
+            delay = _next_attempt(call, route, model, attempt_start, waited, e, attempt, retries,
+                                  base_delay, max_delay, start)
+            if delay is not None:
+                time.sleep(delay)
+            continue
+        _end_attempt(call, route, model, attempt_start, waited)
+        _finish_call(call, start)
+        return content
+
+
+class StreamStats:
+    """Timing for one streamed completion"""
+
+    def __init__(self):
+        self.started = None
+        self.first_token_at = None
+        self.finished = None
+        self.chunks = 0
+        self.completion_tokens = None
+
+    def as_dict(self):
+        ttft = None
+        if self.first_token_at is not None:
+            ttft = round(self.first_token_at - self.started, 4)
+        tokens = self.completion_tokens if self.completion_tokens is not None else self.chunks
+        tokens_per_second = None
+        if self.finished is not None and self.first_token_at is not None:
+            generating = self.finished - self.first_token_at
+            if generating > 0:
+                tokens_per_second = round(tokens / generating, 2)
+        return {
+            'time_to_first_token': ttft,
+            'total_seconds': round(self.finished - self.started, 4) if self.finished else None,
+            'completion_tokens': tokens,
+            'tokens_per_second': tokens_per_second
+        }
+
+
+def stream_text(prompt, system_message=None, temperature=0.7, max_tokens=1500, stats=None,
+                retries=4, base_delay=1.0, max_delay=30.0):
+    """Yield content chunks as they arrive; only the connection attempt is retried"""
+    request = _build_request(prompt, system_message, temperature, max_tokens)
+    call = _new_call(request)
+    call['streamed'] = True
+    route = get_router().route_for(call['route'])
+
+    stats = stats if stats is not None else StreamStats()
+    stats.started = time.perf_counter()
+    client = get_client()
+    limiter = get_rate_limiter()
+    reserved = estimate_request_tokens(request["messages"], max_tokens)
+
+    inflight = _inflight
     for attempt in range(retries + 1):
+        # The latency SLO is not applied here: a stream's length is the
+        # story's length, so only a failed connection moves to the fallback.
+        model, _ = _route_attempt(request, call, route)
+        attempt_start, waited = time.perf_counter(), call['wait_seconds']
+        call['wait_seconds'] += limiter.acquire(reserved)
+        if inflight is not None:
+            queued = time.perf_counter()
+            inflight.acquire()
+            call['wait_seconds'] += time.perf_counter() - queued
         try:
-            return generate_text(prompt, system_message, temperature, max_tokens)
+            stream = client.chat.completions.create(**request, stream=True)
+            break
         except Exception as e:
-            last_error = e
-            if attempt < retries:
-                print(f"Attempt {attempt + 1} failed, retrying...")
-    
-    raise last_error
+            limiter.settle(reserved, 0)
+            if inflight is not None:
+                inflight.release()
+            print(f"Groq API Error: {e}")
+            delay = _next_attempt(call, route, model, attempt_start, waited, e, attempt, retries,
+                                  base_delay, max_delay, stats.started)
+            if delay is not None:
+                time.sleep(delay)
+
+    error = None
+    try:
+        for chunk in stream:
+            x_groq = getattr(chunk, "x_groq", None)
+            usage = getattr(x_groq, "usage", None)
+            if usage is not None and usage.completion_tokens is not None:
+                stats.completion_tokens = usage.completion_tokens
+                _record_usage(call, usage)
+                limiter.settle(reserved, usage.total_tokens or 0)
+
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if not content:
+                continue
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            stats.chunks += 1
+            yield content
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        stats.finished = time.perf_counter()
+        if inflight is not None:
+            inflight.release()
+        stream.close()
+        _end_attempt(call, route, model, attempt_start, waited, error)
+        call.update(stats.as_dict())
+        _finish_call(call, stats.started, error)
+
+
+# Structured stages run at low temperature and are safe to replay from cache;
+# creative generation is expected to vary between runs, so it opts out.
+def generate_creative(prompt, system_message=None, use_cache=False, max_tokens=2000):
+    return generate_with_retry(prompt, system_message, temperature=0.85, max_tokens=max_tokens, use_cache=use_cache)
+
+
+def generate_structured(prompt, system_message=None, use_cache=True, max_tokens=1000):
+    return generate_with_retry(prompt, system_message, temperature=0.4, max_tokens=max_tokens, use_cache=use_cache)
+
+
+def stream_creative(prompt, system_message=None, stats=None, max_tokens=2000):
+    return stream_text(prompt, system_message, temperature=0.85, max_tokens=max_tokens, stats=stats)
+
+
+class _LoopState:
+    """Async client and in-flight cap for one event loop"""
+
+    def __init__(self, client):
+        self.client = client
+        self.inflight = None
+        self.inflight_limit = None
+
+
+def _loop_state():
+    loop = asyncio.get_running_loop()
+    state = _async_states.get(loop)
+    if state is None:
+        with _client_lock:
+            state = _async_states.get(loop)
+            if state is None:
+                import httpx
+                from groq import AsyncGroq
+                api_key, base_url, limits = _client_settings(**_client_options)
+                state = _async_states[loop] = _LoopState(AsyncGroq(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=httpx.AsyncClient(limits=limits),
+                    max_retries=0
+                ))
+    if state.inflight_limit != _max_inflight:
+        state.inflight = asyncio.Semaphore(_max_inflight) if _max_inflight else None
+        state.inflight_limit = _max_inflight
+    return state
+
+
+def get_async_client():
+    """The pooled AsyncGroq client for the running event loop"""
+    return _loop_state().client
+
+
+async def aclose_client():
+    """Close the running loop's async client; call before the loop shuts down"""
+    state = _async_states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.close()
+
+
+async def _asend(request, call, timeout=None, on_send=None):
+    state = _loop_state()
+    limiter = get_rate_limiter()
+    reserved = estimate_request_tokens(request["messages"], request["max_tokens"])
+    call['wait_seconds'] += await limiter.aacquire(reserved)
+
+    inflight = state.inflight
+    if inflight is not None:
+        queued = time.perf_counter()
+        await inflight.acquire()
+        call['wait_seconds'] += time.perf_counter() - queued
+    if on_send is not None:
+        on_send()
+    try:
+        response = await state.client.chat.completions.create(**request, **_timeout_kwargs(timeout))
+    except BaseException as e:
+        # Includes cancellation: the reserved tokens were never used.
+        limiter.settle(reserved, 0)
+        if isinstance(e, Exception):
+            print(f"Groq API Error: {e}")
+        raise
+    finally:
+        if inflight is not None:
+            inflight.release()
+
+    return _settle_response(response, call, limiter, reserved)
+
+
+async def _ahedged_send(hedger, request, call, timeout):
+    """_hedged_send() for coroutines; here the losing copy is cancelled"""
+    stage = call['route']
+    hedger.start(stage)
+    copies = {}
+
+    def launch(on_send=None):
+        scratch = _hedge_scratch()
+        task = asyncio.ensure_future(_asend(dict(request), scratch, timeout, on_send))
+        copies[task] = scratch
+        return task
+
+    sent = asyncio.Event()
+    primary = launch(sent.set)
+    primary.add_done_callback(lambda _: sent.set())
+    try:
+        await sent.wait()
+        started = time.perf_counter()
+
+        delay = hedger.delay_for(stage)
+        if delay is not None:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            if not done and hedger.allow_hedge(stage):
+                call['hedges_sent'] += 1
+                launch()
+
+        pending = set(copies)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                _take_winner(hedger, call, copies[task], task is not primary, started)
+                return task.result()
+        raise error
+    finally:
+        for task in copies:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Mark a failed loser's error as seen.
+                task.exception()
+
+
+async def _acomplete(request, use_cache, call, timeout=None):
+    cache, key, cached = _cache_lookup(request, use_cache, call)
+    if cached is not None:
+        return cached
+
+    hedger = _hedger
+    if hedger is not None and hedger.applies_to(call['route']):
+        content = await _ahedged_send(hedger, request, call, timeout)
+    else:
+        content = await _asend(request, call, timeout)
+    _cache_store(cache, key, content, request)
+    return content
+
+
+async def agenerate_with_retry(prompt, system_message=None, temperature=0.7, max_tokens=1500, retries=4,
+                               use_cache=False, base_delay=1.0, max_delay=30.0):
+    """generate_with_retry() for coroutines; cancel it or wrap it in asyncio.wait_for as needed"""
+    request = _build_request(prompt, system_message, temperature, max_tokens)
+    call = _new_call(request)
+    route = get_router().route_for(call['route'])
+    start = time.perf_counter()
+
+    for attempt in range(retries + 1):
+        model, timeout = _route_attempt(request, call, route)
+        attempt_start, waited = time.perf_counter(), call['wait_seconds']
+        try:
+            content = await _acomplete(request, use_cache, call, timeout)
+        except BaseException as e:
+            # Cancellation included: it is not retryable, so it is recorded and re-raised.
+            delay = _next_attempt(call, route, model, attempt_start, waited, e, attempt, retries,
+                                  base_delay, max_delay, start)
+            if delay is None:
+                continue
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError as cancelled:
+                _finish_call(call, start, cancelled)
+                raise
+            continue
+        _end_attempt(call, route, model, attempt_start, waited)
+        _finish_call(call, start)
+        return content
+
+
+async def agenerate_text(prompt, system_message=None, temperature=0.7, max_tokens=1500, use_cache=False):
+    return await agenerate_with_retry(prompt, system_message, temperature, max_tokens,
+                                      retries=0, use_cache=use_cache)
 
 
-def generate_creative(prompt, system_message=None):
-    return generate_text(prompt, system_message, temperature=0.85, max_tokens=2000)
+async def agenerate_creative(prompt, system_message=None, use_cache=False, max_tokens=2000):
+    return await agenerate_with_retry(prompt, system_message, temperature=0.85, max_tokens=max_tokens, use_cache=use_cache)
 
 
-def generate_structured(prompt, system_message=None):
-    return generate_text(prompt, system_message, temperature=0.4, max_tokens=1000)
+async def agenerate_structured(prompt, system_message=None, use_cache=True, max_tokens=1000):
+    return await agenerate_with_retry(prompt, system_message, temperature=0.4, max_tokens=max_tokens, use_cache=use_cache)
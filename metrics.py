@@ -0,0 +1,238 @@
+import contextvars
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from checkpoint import write_atomic
+
+
+# (recorder, stage, route) for the code currently running; executors that
+# should keep attributing work to a stage submit through contextvars.copy_context().
+_current = contextvars.ContextVar('story_metrics', default=(None, None, None))
+
+
+def current_recorder():
+    return _current.get()[0]
+
+
+def current_stage():
+    return _current.get()[1]
+
+
+def current_route():
+    """The key llm_client routes and hedges by: the stage unless a narrower route was set"""
+    _, stage, route = _current.get()
+    return route or stage
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (pct in 0-100); 0.0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def record_call(call):
+    """Attach one finished LLM call to the active recorder, if any"""
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.add_call(call)
+
+
+class MetricsRecorder:
+    """Per-run stage timings and LLM call records"""
+
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.stages = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def attribute(self, name, route=None):
+        """Attribute LLM calls made inside the block to stage `name`, without timing it
+
+        `route` gives those calls their own routing and hedging key, for
+        requests too unlike the rest of the stage to share its SLO or p95.
+        """
+        token = _current.set((self, name, route))
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def stage(self, name):
+        started_at = time.time()
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            with self.attribute(name):
+                yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = {
+                    'started_at': started_at,
+                    'wall_seconds': round(wall, 4),
+                    'status': status
+                }
+
+    def add_call(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self):
+        with self._lock:
+            stages = {name: dict(info) for name, info in self.stages.items()}
+            calls = list(self.calls)
+
+        for info in stages.values():
+            info.update(_empty_totals())
+        totals = _empty_totals()
+        for call in calls:
+            targets = [totals]
+            if call.get('stage') in stages:
+                targets.append(stages[call['stage']])
+            for target in targets:
+                _accumulate(target, call)
+
+        return {
+            'labels': self.labels,
+            'stages': stages,
+            'totals': totals,
+            'calls': calls
+        }
+
+    def trace_events(self):
+        summary = self.summary()
+        for name, info in summary['stages'].items():
+            event = {'type': 'stage', 'stage': name}
+            event.update(self.labels)
+            event.update({k: v for k, v in info.items()})
+            yield event
+        for call in summary['calls']:
+            event = {'type': 'llm_call'}
+            event.update(self.labels)
+            event.update(call)
+            yield event
+
+    def write_jsonl(self, path):
+        """Append this run's stage and call events to a JSON lines trace"""
+        with open(path, 'a', encoding='utf-8') as f:
+            for event in self.trace_events():
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def _empty_totals():
+    return {
+        'llm_calls': 0,
+        'llm_seconds': 0.0,
+        'wait_seconds': 0.0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'retries': 0,
+        'cache_hits': 0,
+        'errors': 0,
+        'hedges_sent': 0,
+        'hedges_won': 0,
+        'models': []
+    }
+
+
+def _accumulate(target, call):
+    target['llm_calls'] += 1
+    target['llm_seconds'] = round(target['llm_seconds'] + call.get('wall_seconds', 0.0), 4)
+    target['wait_seconds'] = round(target['wait_seconds'] + call.get('wait_seconds', 0.0), 4)
+    target['prompt_tokens'] += call.get('prompt_tokens') or 0
+    target['completion_tokens'] += call.get('completion_tokens') or 0
+    target['retries'] += call.get('retries', 0)
+    target['cache_hits'] += 1 if call.get('cache_hit') else 0
+    target['errors'] += 1 if call.get('error') else 0
+    target['hedges_sent'] += call.get('hedges_sent', 0)
+    target['hedges_won'] += call.get('hedges_won', 0)
+    if call.get('model') and call['model'] not in target['models']:
+        target['models'].append(call['model'])
+
+
+PROMETHEUS_METRICS = [
+    ('story_llm_calls_total', 'counter', 'LLM calls', 'llm_calls'),
+    ('story_llm_seconds_total', 'counter', 'Wall time spent in LLM calls', 'llm_seconds'),
+    ('story_llm_wait_seconds_total', 'counter', 'Time LLM calls waited for rate limits or a free slot', 'wait_seconds'),
+    ('story_llm_prompt_tokens_total', 'counter', 'Prompt tokens sent', 'prompt_tokens'),
+    ('story_llm_completion_tokens_total', 'counter', 'Completion tokens received', 'completion_tokens'),
+    ('story_llm_retries_total', 'counter', 'LLM call retries', 'retries'),
+    ('story_llm_cache_hits_total', 'counter', 'LLM calls served from the response cache', 'cache_hits'),
+    ('story_llm_errors_total', 'counter', 'LLM calls that failed after retries', 'errors'),
+    ('story_llm_hedges_sent_total', 'counter', 'Duplicate requests sent for slow LLM calls', 'hedges_sent'),
+    ('story_llm_hedges_won_total', 'counter', 'Hedged duplicates that answered before the original', 'hedges_won'),
+]
+
+
+def _label_str(labels):
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class PrometheusAggregate:
+    """Running Prometheus totals that recorders are folded into one at a time
+
+    Only the aggregate is kept, so a long batch can re-export after every
+    job without holding on to (or re-reading) the earlier recorders.
+    """
+
+    def __init__(self):
+        self.stage_seconds = {}
+        self.by_stage_model = {}
+
+    def add(self, recorder):
+        summary = recorder.summary()
+        base = {k: summary['labels'][k] for k in ('story', 'world') if k in summary['labels']}
+        for name, info in summary['stages'].items():
+            key = tuple(sorted(dict(base, stage=name).items()))
+            self.stage_seconds[key] = info['wall_seconds']
+        for call in summary['calls']:
+            key = (call.get('stage') or 'none', call.get('model') or 'none')
+            _accumulate(self.by_stage_model.setdefault(key, _empty_totals()), call)
+
+    def format(self):
+        lines = [
+            '# HELP story_pipeline_stage_seconds Wall time of the latest run of each pipeline stage',
+            '# TYPE story_pipeline_stage_seconds gauge',
+        ]
+        for key, value in sorted(self.stage_seconds.items()):
+            lines.append(f"story_pipeline_stage_seconds{_label_str(dict(key))} {value}")
+
+        for metric, kind, help_text, field in PROMETHEUS_METRICS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for (stage, model), totals in sorted(self.by_stage_model.items()):
+                labels = _label_str({'stage': stage, 'model': model})
+                lines.append(f"{metric}{labels} {totals[field]}")
+        return "\n".join(lines) + "\n"
+
+
+def format_prometheus(recorders):
+    """Prometheus text exposition for one or more recorders, aggregated by stage and model"""
+    aggregate = PrometheusAggregate()
+    for recorder in recorders:
+        aggregate.add(recorder)
+    return aggregate.format()
+
+
+def write_prometheus(path, recorders):
+    """Write a node_exporter textfile atomically so scrapes never see a partial file
+
+    `recorders` is a list of MetricsRecorder or a PrometheusAggregate.
+    """
+    text = recorders.format() if isinstance(recorders, PrometheusAggregate) else format_prometheus(recorders)
+    write_atomic(path, lambda f: f.write(text), mode=0o644)
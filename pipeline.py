@@ -1,26 +1,208 @@
+import asyncio
+import contextvars
 import json
-from transformer import create_transformation_context, load_story_data, load_world_data
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from transformer import create_transformation_context, compile_world, load_story_data, load_world_data
 from prompts import (
     get_character_prompt, 
+    get_batch_character_prompt,
     get_conflict_prompt,
     get_assembly_prompt,
+    get_scene_prompt,
+    get_transition_prompt,
     VALIDATION_PROMPT
 )
-from llm_client import generate_structured, generate_creative, generate_text
+from llm_client import (
+    generate_structured,
+    generate_creative,
+    generate_text,
+    stream_creative,
+    agenerate_structured,
+    agenerate_creative,
+    get_router,
+    hedge_stats,
+    StreamStats
+)
+from scheduler import Stage, StageScheduler
+from metrics import MetricsRecorder
+from prevalidator import prevalidate, format_report
+from routing import summarize as summarize_routing
+from similarity import get_index as get_similarity_index, SIMILARITY_POLICIES
+from profiling import Profiler, stage_times
+from token_budget import (
+    compact_character,
+    format_character_summaries,
+    fit_to_tokens,
+    max_tokens_for,
+    CONFLICT_INPUT_TOKENS,
+    VALIDATION_STORY_TOKENS
+)
+
+
+STORY_MODES = ('assembly', 'scenes')
+VALIDATION_MODES = ('llm', 'gate', 'local')
+CHARACTER_MODES = ('parallel', 'batched')
+
+CHARACTER_SYSTEM_MSG = (
+    "You are a creative writing assistant specializing in story adaptation. "
+    "You understand that characters must keep their NARRATIVE FUNCTION while "
+    "changing their surface details to fit new worlds."
+)
+
+CONFLICT_SYSTEM_MSG = (
+    "You are analyzing story structure. The conflict must create the same "
+    "EMOTIONAL STAKES while using completely different surface elements."
+)
+
+STORY_SYSTEM_MSG = (
+    "You are a skilled fiction writer. Write vivid, engaging prose that "
+    "brings this reimagined story to life. Use sensory details and natural "
+    "dialogue. The story should feel fresh while honoring its source."
+)
+
+# (stage, step method, inputs, outputs). Conflict only needs the context, so
+# it runs alongside the character transforms; assembly waits for both.
+STAGE_GRAPH = (
+    ('context', 'step1_build_context', (), ('context',)),
+    ('character', 'step2_transform_characters', ('context',), ('transformed_characters',)),
+    ('conflict', 'step3_transform_conflict', ('context',), ('transformed_conflict',)),
+    ('assembly', 'step4_generate_story',
+     ('transformed_characters', 'transformed_conflict'), ('final_story',)),
+    ('validation', 'step5_validate', ('final_story',), ('validation_result', 'prevalidation')),
+)
+
+
+def downstream_stages(name):
+    """Stages built from `name`'s outputs, directly or through other stages"""
+    produced = set()
+    found = []
+    for stage, _, inputs, outputs in STAGE_GRAPH:
+        if stage == name:
+            produced.update(outputs)
+        elif produced.intersection(inputs):
+            produced.update(outputs)
+            found.append(stage)
+    return found
+
+
+# Function name -> stage, so profiling.Profiler can tell which stage a sampled
+# thread is working for: the step methods plus helpers run on worker threads
+STAGE_FUNCTIONS = dict(
+    [(method, stage) for stage, method, _, _ in STAGE_GRAPH]
+    + [('a' + method, stage) for stage, method, _, _ in STAGE_GRAPH]
+    + [
+        ('_transform_character', 'character'),
+        ('_atransform_character', 'character'),
+        ('_generate_scene_story', 'assembly'),
+        ('write_scene', 'assembly'),
+        ('write_transition', 'assembly'),
+    ]
+)
+
+# Fields every entry of a batched character reply must carry, with the label
+# each one gets in the per-character text format
+CHARACTER_JSON_FIELDS = (
+    ('new_name', 'New name'),
+    ('new_position', 'New position'),
+    ('traits', 'How their traits manifest'),
+    ('backstory', 'Backstory'),
+    ('relationships', 'Key relationships'),
+)
+
+
+def parse_character_batch(text, mappings):
+    """Map original_name -> transformation text for each valid entry of a JSON reply
+
+    Entries that are missing, malformed or for unknown characters are left
+    out, so the caller can transform those characters one at a time.
+    """
+    start = text.find('[')
+    if start < 0:
+        return {}
+    try:
+        entries, _ = json.JSONDecoder().raw_decode(text[start:])
+    except ValueError:
+        return {}
+    if not isinstance(entries, list):
+        return {}
+    
+    wanted = {m['original_name'].strip().lower(): m['original_name'] for m in mappings}
+    parsed = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        original = wanted.get(str(entry.get('original_name', '')).strip().lower())
+        if original is None or original in parsed:
+            continue
+        lines = []
+        for field, label in CHARACTER_JSON_FIELDS:
+            value = entry.get(field)
+            if isinstance(value, list):
+                value = '; '.join(str(v) for v in value)
+            if not isinstance(value, str) or not value.strip():
+                break
+            lines.append(f"- {label}: {value.strip()}")
+        else:
+            parsed[original] = "\n".join(lines)
+    return parsed
 
 
 class StoryTransformationPipeline:
     
-    def __init__(self, story_key, world_key, verbose=True):
+    def __init__(self, story_key, world_key, verbose=True, max_workers=4, on_story_chunk=None,
+                 run_id=None, checkpoint=None, story_mode='assembly', smooth_transitions=False,
+                 validation_mode='llm', character_mode='parallel', similarity_policy='off',
+                 profile=False):
+        if story_mode not in STORY_MODES:
+            raise ValueError(f"Unknown story_mode '{story_mode}'. Available: {list(STORY_MODES)}")
+        if character_mode not in CHARACTER_MODES:
+            raise ValueError(
+                f"Unknown character_mode '{character_mode}'. Available: {list(CHARACTER_MODES)}"
+            )
+        if validation_mode not in VALIDATION_MODES:
+            raise ValueError(
+                f"Unknown validation_mode '{validation_mode}'. Available: {list(VALIDATION_MODES)}"
+            )
+        if similarity_policy not in SIMILARITY_POLICIES:
+            raise ValueError(
+                f"Unknown similarity_policy '{similarity_policy}'. Available: {list(SIMILARITY_POLICIES)}"
+            )
         self.story_key = story_key
         self.world_key = world_key
+        self.run_id = run_id or uuid.uuid4().hex[:12]
         self.verbose = verbose
+        self.max_workers = max_workers
+        self.on_story_chunk = on_story_chunk
+        self.checkpoint = checkpoint
+        self.story_mode = story_mode
+        self.smooth_transitions = smooth_transitions
+        self.validation_mode = validation_mode
+        self.character_mode = character_mode
+        self.similarity_policy = similarity_policy
+        self.profile = profile
         
         self.context = None
         self.transformed_characters = []
+        self.character_errors = []
+        self.character_batch = None
+        self.character_similarity = None
         self.transformed_conflict = None
         self.final_story = None
+        self.story_scenes = None
         self.validation_result = None
+        self.prevalidation = None
+        self.story_regenerated = False
+        self.scheduler = None
+        self.stream_stats = None
+        self.resumed_stages = []
+        self.profiler = None
+        self.metrics = MetricsRecorder(labels={
+            'run_id': self.run_id,
+            'story': story_key,
+            'world': world_key
+        })
     
     def log(self, message):
         if self.verbose:
@@ -33,60 +215,264 @@ class StoryTransformationPipeline:
         self.log(f"  Target: {self.context['target_world']['name']}")
         return self.context
     
+    async def astep1_build_context(self):
+        # Built from local data only, so there is nothing to await.
+        return self.step1_build_context()
+    
     def step2_transform_characters(self):
         self.log("Transforming characters...")
+        mappings = self.context['character_mappings']
         
-        system_msg = (
-            "You are a creative writing assistant specializing in story adaptation. "
-            "You understand that characters must keep their NARRATIVE FUNCTION while "
-            "changing their surface details to fit new worlds."
-        )
+        outcomes = [None] * len(mappings)
+        seeds, reused = self._match_similar(mappings, outcomes)
+        unmatched = [m for m, outcome in zip(mappings, outcomes) if outcome is None]
+        if self.character_mode == 'batched' and unmatched:
+            self._fill_batched(outcomes, mappings, self._transform_characters_batched(unmatched))
+        pending = [i for i, outcome in enumerate(outcomes) if outcome is None]
         
-        for char_mapping in self.context['character_mappings']:
-            self.log(f"  Transforming {char_mapping['original_name']}...")
-            
-            prompt = get_character_prompt(char_mapping)
-            result = generate_structured(prompt, system_msg)
-            
+        # Each character is an independent call, so they can run side by side.
+        # Results are collected in mapping order so the story keeps its cast order.
+        workers = max(1, min(self.max_workers or 1, len(pending)))
+        if workers == 1:
+            for i in pending:
+                outcomes[i] = self._attempt(self._transform_character, mappings[i], seeds[i])
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    i: executor.submit(contextvars.copy_context().run,
+                                       self._attempt, self._transform_character, mappings[i], seeds[i])
+                    for i in pending
+                }
+                for i, future in futures.items():
+                    outcomes[i] = future.result()
+        
+        self._index_characters(mappings, outcomes, reused)
+        return self._collect_characters(mappings, outcomes)
+    
+    async def astep2_transform_characters(self):
+        self.log("Transforming characters...")
+        mappings = self.context['character_mappings']
+        
+        outcomes = [None] * len(mappings)
+        seeds, reused = self._match_similar(mappings, outcomes)
+        unmatched = [m for m, outcome in zip(mappings, outcomes) if outcome is None]
+        if self.character_mode == 'batched' and unmatched:
+            self._fill_batched(outcomes, mappings, await self._atransform_characters_batched(unmatched))
+        pending = [i for i, outcome in enumerate(outcomes) if outcome is None]
+        
+        results = await self._gather_limited([
+            self._aattempt(self._atransform_character(mappings[i], seeds[i])) for i in pending
+        ])
+        for i, outcome in zip(pending, results):
+            outcomes[i] = outcome
+        
+        self._index_characters(mappings, outcomes, reused)
+        return self._collect_characters(mappings, outcomes)
+    
+    def _transform_character(self, char_mapping, example=None):
+        self.log(f"  Transforming {char_mapping['original_name']}...")
+        prompt = get_character_prompt(char_mapping, example)
+        return generate_structured(prompt, CHARACTER_SYSTEM_MSG, max_tokens=max_tokens_for('character'))
+    
+    async def _atransform_character(self, char_mapping, example=None):
+        self.log(f"  Transforming {char_mapping['original_name']}...")
+        prompt = get_character_prompt(char_mapping, example)
+        return await agenerate_structured(prompt, CHARACTER_SYSTEM_MSG, max_tokens=max_tokens_for('character'))
+    
+    def _match_similar(self, mappings, outcomes):
+        """Fill in reused transformations; returns (seed example or None per character, reused indexes)"""
+        seeds = [None] * len(mappings)
+        reused = set()
+        if self.similarity_policy == 'off':
+            return seeds, reused
+        
+        index = get_similarity_index()
+        taken = set()
+        decisions = []
+        for i, char_mapping in enumerate(mappings):
+            # An earlier character is reused at most once per run, so two of
+            # this cast never end up as the same person.
+            action, entry, score = index.lookup(
+                self.story_key, self.world_key, char_mapping, self.similarity_policy, exclude=taken
+            )
+            if action == 'reuse':
+                taken.add(entry['position'])
+                reused.add(i)
+                outcomes[i] = (entry['transformation'], None)
+            elif action == 'seed':
+                seeds[i] = entry
+            match = f"{entry['story']}/{entry['original_name']}" if entry else None
+            if action:
+                self.log(f"  {char_mapping['original_name']}: {action} {match} (similarity {score})")
+            decisions.append({
+                'original': char_mapping['original_name'],
+                'action': action or 'fresh',
+                'match': match,
+                'similarity': round(score, 3)
+            })
+        self.character_similarity = {'policy': self.similarity_policy, 'characters': decisions}
+        return seeds, reused
+    
+    def _index_characters(self, mappings, outcomes, reused):
+        if self.similarity_policy == 'off':
+            return
+        index = get_similarity_index()
+        for i, (char_mapping, (result, error)) in enumerate(zip(mappings, outcomes)):
+            if error is None and i not in reused and result:
+                index.add(self.story_key, self.world_key, char_mapping, result)
+        self.character_similarity['index'] = index.stats()
+    
+    def _transform_characters_batched(self, mappings):
+        # One request for the whole cast sends the world context and system
+        # prompt once; anything that does not parse is retried per character.
+        self.log(f"  Transforming {len(mappings)} characters in one request...")
+        # Its own route: a cast-sized reply would blow the per-character SLO and p95.
+        with self.metrics.attribute('character', route='character_batch'):
+            reply, error = self._attempt(
+                generate_structured, get_batch_character_prompt(mappings), CHARACTER_SYSTEM_MSG, True,
+                max_tokens_for('character', scale=len(mappings))
+            )
+        return self._parse_batch_reply(mappings, reply, error)
+    
+    async def _atransform_characters_batched(self, mappings):
+        self.log(f"  Transforming {len(mappings)} characters in one request...")
+        with self.metrics.attribute('character', route='character_batch'):
+            reply, error = await self._aattempt(agenerate_structured(
+                get_batch_character_prompt(mappings), CHARACTER_SYSTEM_MSG, True,
+                max_tokens_for('character', scale=len(mappings))
+            ))
+        return self._parse_batch_reply(mappings, reply, error)
+    
+    def _parse_batch_reply(self, mappings, reply, error):
+        parsed = parse_character_batch(reply, mappings) if error is None else {}
+        if error is not None:
+            self.log(f"  Batched request failed: {error}")
+        self.character_batch = {
+            'requested': len(mappings),
+            'parsed': len(parsed),
+            'fallback': len(mappings) - len(parsed),
+            'error': str(error) if error is not None else None
+        }
+        return parsed
+    
+    def _fill_batched(self, outcomes, mappings, parsed):
+        for i, char_mapping in enumerate(mappings):
+            if char_mapping['original_name'] in parsed:
+                outcomes[i] = (parsed[char_mapping['original_name']], None)
+        missing = outcomes.count(None)
+        if missing:
+            self.log(f"  Falling back to single calls for {missing} character(s)")
+    
+    def _collect_characters(self, mappings, outcomes):
+        self.transformed_characters = []
+        self.character_errors = []
+        for char_mapping, (result, error) in zip(mappings, outcomes):
+            if error is not None:
+                self.log(f"  Failed to transform {char_mapping['original_name']}: {error}")
+                self.character_errors.append({
+                    'original': char_mapping['original_name'],
+                    'error': str(error)
+                })
+                continue
             self.transformed_characters.append({
                 'original': char_mapping['original_name'],
                 'transformation': result
             })
         
+        if not self.transformed_characters:
+            raise RuntimeError(
+                f"All {len(mappings)} character transformations failed: "
+                f"{self.character_errors[0]['error']}"
+            )
+        
         self.log(f"  Transformed {len(self.transformed_characters)} characters")
+        if self.character_errors:
+            self.log(f"  {len(self.character_errors)} character(s) failed and were left out")
         return self.transformed_characters
     
-    def step3_transform_conflict(self):
-        self.log("Transforming central conflict...")
+    @staticmethod
+    def _attempt(func, *args):
+        try:
+            return func(*args), None
+        except Exception as e:
+            return None, e
+    
+    @staticmethod
+    async def _aattempt(coro):
+        try:
+            return await coro, None
+        except Exception as e:
+            return None, e
+    
+    async def _gather_limited(self, coros):
+        # Mirrors the thread pool's max_workers cap on the async path.
+        limit = asyncio.Semaphore(max(1, self.max_workers or 1))
+        failed = False
         
-        system_msg = (
-            "You are analyzing story structure. The conflict must create the same "
-            "EMOTIONAL STAKES while using completely different surface elements."
-        )
+        async def limited(coro):
+            nonlocal failed
+            try:
+                async with limit:
+                    if failed:
+                        return None
+                    return await coro
+            except Exception:
+                failed = True
+                raise
+            finally:
+                # Silences "never awaited" for coroutines that never got a slot.
+                coro.close()
         
-        prompt = get_conflict_prompt(
+        tasks = [asyncio.ensure_future(limited(c)) for c in coros]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            # Once one fails the stage has failed: stop the rest, including
+            # those still waiting for the semaphore, before re-raising.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    
+    def _conflict_prompt(self):
+        return get_conflict_prompt(
             self.context['conflict_mapping'],
             self.context['target_world']['name']
         )
-        
-        self.transformed_conflict = generate_structured(prompt, system_msg)
+    
+    def step3_transform_conflict(self):
+        self.log("Transforming central conflict...")
+        self.transformed_conflict = generate_structured(
+            self._conflict_prompt(), CONFLICT_SYSTEM_MSG, max_tokens=max_tokens_for('conflict')
+        )
         self.log("  Conflict transformed")
         return self.transformed_conflict
     
-    def step4_generate_story(self):
-        self.log("Generating full story...")
-        
-        char_summaries = "\n\n".join([
-            f"**{c['original']}** becomes:\n{c['transformation']}"
+    async def astep3_transform_conflict(self):
+        self.log("Transforming central conflict...")
+        self.transformed_conflict = await agenerate_structured(
+            self._conflict_prompt(), CONFLICT_SYSTEM_MSG, max_tokens=max_tokens_for('conflict')
+        )
+        self.log("  Conflict transformed")
+        return self.transformed_conflict
+    
+    def _story_inputs(self):
+        # Compact name/position/traits lines instead of the full transformation
+        # text keep the prompt from growing with every character.
+        char_summaries = format_character_summaries([
+            compact_character(c['original'], c['transformation'])
             for c in self.transformed_characters
         ])
-        
+        conflict = fit_to_tokens(self.transformed_conflict, CONFLICT_INPUT_TOKENS)
+        return char_summaries, conflict
+    
+    def _assembly_prompt(self, char_summaries, conflict):
         scene_summaries = "\n".join([
             f"- {beat['original_beat']}" 
             for beat in self.context['plot_structure']
         ])
         
-        prompt = get_assembly_prompt(
+        return get_assembly_prompt(
             source_info={
                 'title': self.context['source_story']['title'],
                 'themes': self.context['source_story']['themes'],
@@ -94,56 +480,438 @@ class StoryTransformationPipeline:
             },
             world_info=self.context['target_world'],
             characters=char_summaries,
-            conflict=self.transformed_conflict,
+            conflict=conflict,
             scenes=scene_summaries
         )
+    
+    def step4_generate_story(self):
+        self.log("Generating full story...")
+        char_summaries, conflict = self._story_inputs()
         
-        system_msg = (
-            "You are a skilled fiction writer. Write vivid, engaging prose that "
-            "brings this reimagined story to life. Use sensory details and natural "
-            "dialogue. The story should feel fresh while honoring its source."
-        )
+        if self.story_mode == 'scenes':
+            self.final_story = self._generate_scene_story(char_summaries, conflict)
+            self.log(f"  Story generated from {len(self.story_scenes)} scenes")
+            return self.final_story
+        
+        prompt = self._assembly_prompt(char_summaries, conflict)
+        max_tokens = max_tokens_for('assembly')
         
-        self.final_story = generate_creative(prompt, system_msg)
+        if self.on_story_chunk is None:
+            self.final_story = generate_creative(prompt, STORY_SYSTEM_MSG, max_tokens=max_tokens)
+        else:
+            stats = StreamStats()
+            parts = []
+            for chunk in stream_creative(prompt, STORY_SYSTEM_MSG, stats=stats, max_tokens=max_tokens):
+                parts.append(chunk)
+                self.on_story_chunk(chunk)
+            self.final_story = ''.join(parts)
+            self.stream_stats = stats.as_dict()
+            if self.verbose:
+                # Streamed text usually stops mid-line; keep the next log line separate.
+                print()
         self.log("  Story generated")
         return self.final_story
     
-    def step5_validate(self):
-        self.log("Validating thematic fidelity...")
+    async def astep4_generate_story(self):
+        # No token streaming on the async path: on_story_chunk gets the
+        # finished story in one piece.
+        self.log("Generating full story...")
+        char_summaries, conflict = self._story_inputs()
+        started = time.perf_counter()
+        
+        if self.story_mode == 'scenes':
+            plan = self._scene_plan(char_summaries, conflict)
+            scenes = await self._gather_limited([
+                agenerate_creative(self._scene_prompt(plan, i), STORY_SYSTEM_MSG,
+                                   max_tokens=max_tokens_for('scene'))
+                for i in range(len(plan['beats']))
+            ])
+            scenes = [scene.strip() for scene in scenes]
+            transitions = []
+            if self.smooth_transitions and len(scenes) > 1:
+                self.log("  Smoothing scene transitions...")
+                transitions = await self._gather_limited([
+                    agenerate_creative(self._transition_prompt(scenes, i, plan), STORY_SYSTEM_MSG,
+                                       max_tokens=max_tokens_for('transition'))
+                    for i in range(len(scenes) - 1)
+                ])
+                transitions = [t.strip() for t in transitions]
+            self.story_scenes = scenes
+            self.final_story = self._join_scenes(scenes, transitions)
+        else:
+            self.final_story = await agenerate_creative(
+                self._assembly_prompt(char_summaries, conflict), STORY_SYSTEM_MSG,
+                max_tokens=max_tokens_for('assembly')
+            )
         
-        prompt = VALIDATION_PROMPT.format(
+        if self.on_story_chunk is not None:
+            self._emit_whole_story(started, time.perf_counter())
+        self.log("  Story generated")
+        return self.final_story
+    
+    def _emit_whole_story(self, started, first_emit):
+        self.on_story_chunk(self.final_story)
+        self.stream_stats = {
+            'time_to_first_token': round(first_emit - started, 4),
+            'total_seconds': round(time.perf_counter() - started, 4),
+            'completion_tokens': None,
+            'tokens_per_second': None
+        }
+        if self.verbose:
+            print()
+    
+    def _scene_plan(self, char_summaries, conflict):
+        source = self.context['source_story']
+        world_setting = self.context['target_world']['setting']
+        return {
+            'beats': self.context['plot_structure'],
+            'themes': source['themes'],
+            'world_setting': world_setting,
+            'source_info': {
+                'title': source['title'],
+                'author': source['author'],
+                'emotional_core': source['emotional_core'],
+                'target_setting': world_setting
+            },
+            'cast': (
+                f"{char_summaries}\n\n"
+                f"CENTRAL CONFLICT (already transformed):\n{conflict}"
+            )
+        }
+    
+    def _scene_prompt(self, plan, index):
+        beats = plan['beats']
+        beat = dict(beats[index])
+        position = f"scene {index + 1} of {len(beats)}"
+        if index + 1 < len(beats):
+            position += f"; the next scene covers: {beats[index + 1]['original_beat']}"
+        beat['original_beat'] = f"{beat['original_beat']} ({position})"
+        theme = plan['themes'][index % len(plan['themes'])]
+        self.log(f"  Writing scene {index + 1}/{len(beats)}...")
+        return get_scene_prompt(beat, plan['source_info'], theme, plan['cast'])
+    
+    @staticmethod
+    def _transition_prompt(scenes, index, plan):
+        return get_transition_prompt(scenes[index], scenes[index + 1], plan['world_setting'])
+    
+    @staticmethod
+    def _join_scenes(scenes, transitions):
+        parts = []
+        for i, scene in enumerate(scenes):
+            parts.append(scene)
+            if i < len(transitions):
+                parts.append(transitions[i])
+        return "\n\n".join(parts)
+    
+    def _generate_scene_story(self, char_summaries, conflict):
+        # One scene per plot beat, written concurrently, so wall time tracks the
+        # slowest scene rather than the length of the whole story.
+        plan = self._scene_plan(char_summaries, conflict)
+        beats = plan['beats']
+        
+        def write_scene(index):
+            return generate_creative(self._scene_prompt(plan, index), STORY_SYSTEM_MSG,
+                                     max_tokens=max_tokens_for('scene'))
+        
+        def write_transition(index):
+            return generate_creative(
+                self._transition_prompt(scenes, index, plan), STORY_SYSTEM_MSG,
+                max_tokens=max_tokens_for('transition')
+            ).strip()
+        
+        started = time.perf_counter()
+        first_emit = None
+        workers = max(1, min(self.max_workers or 1, len(beats)))
+        stream_scenes = self.on_story_chunk is not None and not self.smooth_transitions
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, write_scene, i)
+                for i in range(len(beats))
+            ]
+            scenes = []
+            # Collecting in order lets finished scenes stream as soon as
+            # every scene before them is done.
+            for i, future in enumerate(futures):
+                scenes.append(future.result().strip())
+                if stream_scenes:
+                    if first_emit is None:
+                        first_emit = time.perf_counter()
+                    self.on_story_chunk(scenes[-1] if i == 0 else "\n\n" + scenes[-1])
+            
+            transitions = []
+            if self.smooth_transitions and len(scenes) > 1:
+                self.log("  Smoothing scene transitions...")
+                transitions = [
+                    f.result() for f in [
+                        executor.submit(contextvars.copy_context().run, write_transition, i)
+                        for i in range(len(scenes) - 1)
+                    ]
+                ]
+        
+        story = self._join_scenes(scenes, transitions)
+        self.story_scenes = scenes
+        
+        if self.on_story_chunk is not None:
+            if stream_scenes:
+                self.stream_stats = {
+                    'time_to_first_token': round(first_emit - started, 4),
+                    'total_seconds': round(time.perf_counter() - started, 4),
+                    'completion_tokens': None,
+                    'tokens_per_second': None
+                }
+                if self.verbose:
+                    print()
+            else:
+                self.final_story = story
+                self._emit_whole_story(started, time.perf_counter())
+        
+        return story
+    
+    def prevalidate_story(self):
+        """Local heuristic check of the story against themes, new cast and world"""
+        names = [
+            compact_character(c['original'], c['transformation']).get('name')
+            for c in self.transformed_characters
+        ]
+        return prevalidate(
+            self.final_story,
+            self.context['source_story']['themes'],
+            character_names=names,
+            world_data=compile_world(self.world_key)['data'],
+            original_names=[m['original_name'] for m in self.context['character_mappings']]
+        )
+    
+    def _run_prevalidation(self, label="Pre-validation"):
+        self.prevalidation = self.prevalidate_story()
+        verdict = self.prevalidation['verdict']
+        self.log(f"  {label}: {verdict} (score {self.prevalidation['score']:.2f})")
+        return verdict
+    
+    def _should_regenerate(self, verdict):
+        if self.validation_mode != 'gate' or verdict != 'fail':
+            return False
+        if self.on_story_chunk is not None:
+            # The story has already been shown; a silent rewrite would not match it.
+            self.log("  Not regenerating a streamed story")
+            return False
+        self.log("  Clear failure, regenerating the story once...")
+        return True
+    
+    def _after_regeneration(self):
+        self.story_regenerated = True
+        self._save_checkpoint('assembly', ['final_story'])
+        return self._run_prevalidation("Pre-validation after rewrite")
+    
+    def _skip_llm_validation(self, verdict):
+        if self.validation_mode == 'local' or (self.validation_mode == 'gate' and verdict == 'pass'):
+            self.validation_result = format_report(self.prevalidation)
+            self.log("  Validation complete (LLM check skipped)")
+            return True
+        return False
+    
+    def _validation_prompt(self):
+        return VALIDATION_PROMPT.format(
             original_themes=', '.join(self.context['source_story']['themes']),
             emotional_core=self.context['source_story']['emotional_core'],
-            story_text=self.final_story
+            story_text=fit_to_tokens(self.final_story, VALIDATION_STORY_TOKENS)
         )
+    
+    def step5_validate(self):
+        self.log("Validating thematic fidelity...")
+        
+        # The local check is cheap, so it always runs; 'gate' uses it to skip
+        # the LLM call on a clear pass or rewrite the story on a clear failure.
+        verdict = self._run_prevalidation()
+        if self._should_regenerate(verdict):
+            # A story call: route, hedge and account it as assembly, not validation.
+            with self.metrics.attribute('assembly'):
+                self.step4_generate_story()
+            verdict = self._after_regeneration()
+        if self._skip_llm_validation(verdict):
+            return self.validation_result
         
-        self.validation_result = generate_structured(prompt)
+        self.validation_result = generate_structured(
+            self._validation_prompt(), max_tokens=max_tokens_for('validation')
+        )
         self.log("  Validation complete")
         return self.validation_result
     
-    def run(self):
-        self.log("Starting Story Transformation Pipeline")
+    async def astep5_validate(self):
+        self.log("Validating thematic fidelity...")
+        
+        verdict = self._run_prevalidation()
+        if self._should_regenerate(verdict):
+            with self.metrics.attribute('assembly'):
+                await self.astep4_generate_story()
+            verdict = self._after_regeneration()
+        if self._skip_llm_validation(verdict):
+            return self.validation_result
+        
+        self.validation_result = await agenerate_structured(
+            self._validation_prompt(), max_tokens=max_tokens_for('validation')
+        )
+        self.log("  Validation complete")
+        return self.validation_result
+    
+    def _stage(self, name, func, inputs=(), outputs=()):
+        def run_stage():
+            with self.metrics.stage(name):
+                result = func()
+            self._save_checkpoint(name, outputs)
+            return result
+        return Stage(name, run_stage, inputs=inputs, outputs=outputs)
+    
+    def _astage(self, name, func, inputs=(), outputs=()):
+        async def run_stage():
+            with self.metrics.stage(name):
+                result = await func()
+            self._save_checkpoint(name, outputs)
+            return result
+        return Stage(name, run_stage, inputs=inputs, outputs=outputs)
+    
+    def stages(self):
+        return [
+            self._stage(name, getattr(self, method), inputs, outputs)
+            for name, method, inputs, outputs in STAGE_GRAPH
+        ]
+    
+    def astages(self):
+        """stages() with coroutine functions, for StageScheduler.arun"""
+        return [
+            self._astage(name, getattr(self, 'a' + method), inputs, outputs)
+            for name, method, inputs, outputs in STAGE_GRAPH
+        ]
+    
+    def _save_checkpoint(self, name, outputs):
+        if self.checkpoint is None:
+            return
+        if self.character_errors and (name == 'character' or name in downstream_stages('character')):
+            # Leave the stage unfinished so a resume retries the failed characters,
+            # and everything built from the incomplete cast runs again after them.
+            return
+        for output in outputs:
+            self.checkpoint.save(self.run_id, output, getattr(self, output))
+    
+    def options(self):
+        """The keyword options that change what the stages produce, as saved with a checkpoint"""
+        return {
+            'story_mode': self.story_mode,
+            'smooth_transitions': self.smooth_transitions,
+            'validation_mode': self.validation_mode,
+            'character_mode': self.character_mode,
+            'similarity_policy': self.similarity_policy
+        }
+    
+    def restore_checkpoint(self):
+        """Load finished stage outputs for this run_id; returns the restored output names"""
+        if self.checkpoint is None:
+            return []
         
-        self.step1_build_context()
-        self.step2_transform_characters()
-        self.step3_transform_conflict()
-        self.step4_generate_story()
-        self.step5_validate()
+        options = self.options()
+        manifest = self.checkpoint.create(self.run_id, self.story_key, self.world_key, options)
+        if (manifest['story_key'], manifest['world_key']) != (self.story_key, self.world_key):
+            raise ValueError(
+                f"Run '{self.run_id}' was for {manifest['story_key']} x {manifest['world_key']}, "
+                f"not {self.story_key} x {self.world_key}"
+            )
+        # Manifests written before options were recorded have none to compare.
+        saved_options = manifest.get('options') or options
+        if saved_options != options:
+            changed = ', '.join(
+                f"{key}={saved_options.get(key)!r}" for key in options if saved_options.get(key) != options[key]
+            )
+            raise ValueError(f"Run '{self.run_id}' was started with {changed}; resume it with the same options")
         
-        self.log("Pipeline complete!")
+        saved = self.checkpoint.load(self.run_id)
+        restored = []
+        self.resumed_stages = []
+        for stage in self.stages():
+            # A stage whose inputs run again is stale, whatever was saved for it.
+            if not all(i in restored for i in stage.inputs):
+                continue
+            if stage.outputs and all(output in saved for output in stage.outputs):
+                for output in stage.outputs:
+                    setattr(self, output, saved[output])
+                restored.extend(stage.outputs)
+                self.resumed_stages.append(stage.name)
+        return restored
+    
+    def _start_run(self):
+        self.log("Starting Story Transformation Pipeline")
+        if self.profile:
+            self.profiler = Profiler(STAGE_FUNCTIONS).start()
         
+        available = self.restore_checkpoint()
+        if self.resumed_stages:
+            self.log(f"Resuming run {self.run_id}: reusing {', '.join(self.resumed_stages)}")
+        return available
+    
+    def _finish_run(self):
+        schedule = self.scheduler.report()
+        self.log(
+            f"Pipeline complete in {schedule['wall_seconds']:.2f}s "
+            f"(critical path: {' -> '.join(schedule['critical_path'])})"
+        )
         return self.get_full_output()
     
+    def _stop_profiler(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+    
+    def write_profile(self, base):
+        """With profile=True, write <base>.prof, <base>.collapsed and <base>.profile.txt"""
+        walls, llm = stage_times(self.metrics.summary())
+        return self.profiler.write(base, walls, llm)
+    
+    def run(self):
+        available = self._start_run()
+        self.scheduler = StageScheduler(self.stages())
+        try:
+            self.scheduler.run(available=available)
+        finally:
+            self._stop_profiler()
+        return self._finish_run()
+    
+    async def arun(self):
+        """run() on the caller's event loop; cancelling it cancels the running stages"""
+        available = self._start_run()
+        self.scheduler = StageScheduler(self.astages())
+        try:
+            await self.scheduler.arun(available=available)
+        finally:
+            self._stop_profiler()
+        return self._finish_run()
+    
     def get_full_output(self):
+        metrics = self.metrics.summary()
         return {
             'metadata': {
+                'run_id': self.run_id,
                 'source': self.context['source_story']['title'],
                 'target_world': self.context['target_world']['name'],
-                'themes_preserved': self.context['source_story']['themes']
+                'themes_preserved': self.context['source_story']['themes'],
+                'story_mode': self.story_mode,
+                'schedule': self.scheduler.report() if self.scheduler else None,
+                'streaming': self.stream_stats,
+                'metrics': metrics,
+                'routing': summarize_routing(metrics['calls'], get_router()),
+                'hedging': hedge_stats(),
+                'resumed_stages': self.resumed_stages,
+                'validation_mode': self.validation_mode,
+                'character_mode': self.character_mode,
+                'character_batch': self.character_batch,
+                'similarity_policy': self.similarity_policy,
+                'character_similarity': self.character_similarity,
+                'profile': self.profiler.summary(stage_times(metrics)[0]) if self.profiler else None,
+                'prevalidation': self.prevalidation,
+                'story_regenerated': self.story_regenerated
             },
             'transformation_details': {
                 'characters': self.transformed_characters,
-                'conflict': self.transformed_conflict
+                'character_errors': self.character_errors,
+                'conflict': self.transformed_conflict,
+                'scenes': self.story_scenes
             },
             'story': self.final_story,
             'validation': self.validation_result
@@ -0,0 +1,182 @@
+import re
+
+
+STOPWORDS = {
+    'a', 'an', 'and', 'as', 'at', 'but', 'by', 'for', 'from', 'in', 'into', 'is',
+    'it', 'of', 'on', 'or', 'the', 'their', 'to', 'vs', 'versus', 'with', 'who'
+}
+
+# Related words that count towards a theme keyword, keyed by stem
+THEME_LEXICON = {
+    'love': {'lover', 'heart', 'romanc', 'adore', 'kiss', 'beloved', 'devotion'},
+    'death': {'die', 'dead', 'dying', 'grave', 'funeral', 'kill', 'corpse'},
+    'loyal': {'allegiance', 'faithful', 'betray', 'oath', 'devotion'},
+    'famil': {'father', 'mother', 'son', 'daughter', 'brother', 'sister', 'clan', 'house'},
+    'fate': {'destiny', 'doom', 'fortune', 'prophecy', 'inevitabl'},
+    'free': {'choice', 'choose', 'defy', 'defian'},
+    'power': {'control', 'rule', 'throne', 'command', 'authority'},
+    'ambition': {'ambitious', 'crown', 'climb', 'throne', 'power'},
+    'revenge': {'vengeance', 'aveng', 'retribution', 'reckon'},
+    'guilt': {'shame', 'remorse', 'conscience', 'blood'},
+    'madness': {'mad', 'insan', 'unravel', 'delusion'},
+    'jealous': {'envy', 'suspicion', 'suspect'},
+    'home': {'return', 'homecoming', 'hearth'},
+    'youth': {'young', 'teen', 'boy', 'girl', 'kid'},
+    'impuls': {'rash', 'reckless', 'hasty', 'sudden'},
+    'desire': {'want', 'long', 'yearn', 'crave'},
+}
+
+SUFFIXES = ('ness', 'ing', 'ity', 'ful', 'ive', 'ed', 'es', 'ly', 'ty', 's', 'y')
+
+# Weights of the three coverage scores in the overall score
+WEIGHTS = {'themes': 0.5, 'characters': 0.25, 'world': 0.25}
+PASS_SCORE = 0.75
+FAIL_SCORE = 0.4
+WORLD_TERMS_TARGET = 6
+
+WORLD_VOCAB_FIELDS = (
+    'power_structures', 'conflicts', 'communication', 'social_hierarchy',
+    'values', 'taboos', 'aesthetic', 'technology_level'
+)
+
+_WORD = re.compile(r"[a-z][a-z'\-]*")
+
+
+def _stem(word):
+    for _ in range(2):
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    return word
+
+
+def _stems(text):
+    return {_stem(w.strip("'-")) for w in _WORD.findall(text.lower())}
+
+
+def _content_stems(phrase):
+    return [s for s in (_stem(w) for w in _WORD.findall(phrase.lower())) if s not in STOPWORDS]
+
+
+def _found(stem, story_stems):
+    # Prefix matching covers what the suffix stripper misses ('love'/'loved').
+    # Short stems must match exactly; 'son' should not match 'song'.
+    if stem in story_stems:
+        return True
+    return len(stem) >= 4 and any(s.startswith(stem) for s in story_stems)
+
+
+def _matches(stem, story_stems):
+    if _found(stem, story_stems):
+        return True
+    return any(_found(_stem(related), story_stems) for related in THEME_LEXICON.get(stem, ()))
+
+
+def theme_coverage(story_stems, themes):
+    """Per-theme share of its keywords (or their related words) found in the story"""
+    coverage = {}
+    for theme in themes:
+        keywords = _content_stems(theme)
+        found = [k for k in keywords if _matches(k, story_stems)]
+        coverage[theme] = round(len(found) / len(keywords), 3) if keywords else 1.0
+    return coverage
+
+
+def world_vocabulary(world_data):
+    """Distinct terms from a world's lists, e.g. 'venture capital firms', 'Slack'"""
+    terms = []
+    for field in WORLD_VOCAB_FIELDS:
+        value = world_data.get(field) or []
+        if isinstance(value, str):
+            value = value.split(',')
+        for term in value:
+            term = term.strip()
+            if term and term.lower() not in (t.lower() for t in terms):
+                terms.append(term)
+    return terms
+
+
+def _term_present(term, story_stems):
+    # A multi-word term counts when most of its content words appear.
+    stems = _content_stems(term)
+    if not stems:
+        return False
+    found = sum(1 for s in stems if _found(s, story_stems))
+    return found * 2 > len(stems) if len(stems) > 1 else found == 1
+
+
+def prevalidate(story_text, themes, character_names=(), world_data=None, original_names=()):
+    """Score a story against its themes, new cast and world without an LLM call
+
+    Returns a dict with per-part coverage, an overall 0-1 'score' and a
+    'verdict' of 'pass', 'fail' or 'uncertain'. Original character names
+    still present in the story are listed under 'leaked_names' and keep
+    the verdict from being 'pass'.
+    """
+    story_stems = _stems(story_text or '')
+    lowered = (story_text or '').lower()
+
+    themes_found = theme_coverage(story_stems, themes)
+    theme_score = sum(themes_found.values()) / len(themes_found) if themes_found else 1.0
+
+    names = [n for n in character_names if n]
+    present_names = [n for n in names if n.split()[0].lower() in lowered]
+    character_score = len(present_names) / len(names) if names else 1.0
+
+    vocabulary = world_vocabulary(world_data or {})
+    world_terms = [t for t in vocabulary if _term_present(t, story_stems)]
+    target = min(WORLD_TERMS_TARGET, len(vocabulary))
+    world_score = min(1.0, len(world_terms) / target) if target else 1.0
+
+    leaked = [
+        n for n in original_names
+        if n and not n.lower().startswith('the ') and re.search(rf"\b{re.escape(n.lower())}\b", lowered)
+    ]
+
+    score = (
+        WEIGHTS['themes'] * theme_score
+        + WEIGHTS['characters'] * character_score
+        + WEIGHTS['world'] * world_score
+    )
+    if not story_stems or score < FAIL_SCORE:
+        verdict = 'fail'
+    elif score >= PASS_SCORE and not leaked:
+        verdict = 'pass'
+    else:
+        verdict = 'uncertain'
+
+    return {
+        'verdict': verdict,
+        'score': round(score, 3),
+        'themes': themes_found,
+        'theme_score': round(theme_score, 3),
+        'characters_present': present_names,
+        'characters_missing': [n for n in names if n not in present_names],
+        'character_score': round(character_score, 3),
+        'world_terms': world_terms,
+        'world_score': round(world_score, 3),
+        'leaked_names': leaked
+    }
+
+
+def format_report(result):
+    """Plain-text report in the shape of the LLM validation answer"""
+    lines = ["Local pre-validation (no LLM call)", ""]
+    lines.append("1. Themes:")
+    for theme, share in result['themes'].items():
+        status = 'present' if share >= 0.5 else 'missing'
+        lines.append(f"   - {theme}: {status} ({share:.0%} of keywords)")
+    lines.append(
+        f"2. Characters present: {len(result['characters_present'])}"
+        f"/{len(result['characters_present']) + len(result['characters_missing'])}"
+    )
+    if result['characters_missing']:
+        lines.append(f"   Missing: {', '.join(result['characters_missing'])}")
+    lines.append(f"3. World terms used: {', '.join(result['world_terms']) or 'none'}")
+    if result['leaked_names']:
+        lines.append(f"   Original names still present: {', '.join(result['leaked_names'])}")
+    lines.append(f"4. Heuristic fidelity: {result['score'] * 10:.1f}/10 ({result['verdict']})")
+    return "\n".join(lines)
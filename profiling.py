@@ -0,0 +1,317 @@
+"""CPU, memory and wait-time profiling for one run
+
+A Profiler combines three views of the same interval:
+
+- cProfile on every thread started while it runs (merged into one .prof)
+- tracemalloc peak and top allocation sites
+- a sampling thread that records each thread's stack and CPU clock, so wall
+  time per pipeline stage splits into CPU and waiting (network, rate
+  limiter, locks). The stacks are also written as collapsed stacks for
+  flamegraph.pl / speedscope.
+
+Stages are recognised from the functions on each sampled stack, using a
+{function name: stage} map (see pipeline.STAGE_FUNCTIONS).
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+DEFAULT_INTERVAL = 0.005
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+
+# Work outside the pipeline stages that run.py does for every run
+DEFAULT_PHASES = {
+    'load_story_data': 'load',
+    'load_world_data': 'load',
+    'write_outputs': 'output',
+    'save_output': 'output',
+}
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _thread_cpu(ident):
+    """CPU seconds used by another thread so far, or None where the OS can't tell"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+def _short_path(filename):
+    if filename and filename.startswith(_ROOT):
+        return os.path.relpath(filename, _ROOT)
+    return filename or '<unknown>'
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+
+    def __init__(self, stage_functions=None, interval=DEFAULT_INTERVAL, memory=True):
+        self.stage_functions = dict(DEFAULT_PHASES, **(stage_functions or {}))
+        self.interval = interval
+        self.memory = memory
+        self.stages = {}
+        self.stacks = {}
+        self.samples = 0
+        # Per-thread CPU clocks exist on Linux and most Unixes, not on Windows
+        self.cpu_clock = _thread_cpu(threading.get_ident()) is not None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.memory_peak = None
+        self.top_allocations = []
+        self._profiles = []
+        self._profiles_lock = threading.Lock()
+        self._cpu_seen = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+        self._started_cpu = None
+        self._owns_tracemalloc = False
+        self._stats = None
+
+    # cProfile only follows the thread that enabled it, so each new thread
+    # enables its own profiler on its first profiling event.
+    def _thread_bootstrap(self, frame, event, arg):
+        sys.setprofile(None)
+        if self._stop.is_set():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ has one process-wide profiler that already covers this thread.
+            return
+        with self._profiles_lock:
+            self._profiles.append(profile)
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        elif self.memory:
+            tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+        profile = cProfile.Profile()
+        profile.enable()
+        self._profiles.append(profile)
+        threading.setprofile(self._thread_bootstrap)
+
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._started is None or self._stop.is_set():
+            return self
+        self._stop.set()
+        threading.setprofile(None)
+        self._profiles[0].disable()
+        self._sampler.join()
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_seconds = time.process_time() - self._started_cpu
+
+        if self.memory:
+            self.memory_peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ))
+            self.top_allocations = [
+                {
+                    'location': f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    'size_bytes': stat.size,
+                    'count': stat.count
+                }
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            ]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+        with self._profiles_lock:
+            profiles = list(self._profiles)
+        self._stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            # Threads still alive keep their profiler enabled; the stats are a snapshot.
+            self._stats.add(profile)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _stage_of(self, stack):
+        # Innermost match wins, e.g. a helper that runs on a worker thread.
+        for code in reversed(stack):
+            stage = self.stage_functions.get(code.co_name)
+            if stage is not None:
+                return stage
+        return None
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+
+                cpu = _thread_cpu(ident) if self.cpu_clock else None
+                previous = self._cpu_seen.get(ident)
+                self._cpu_seen[ident] = cpu
+                # A reused thread id restarts its clock, so never count a negative delta
+                cpu_delta = max(0.0, cpu - previous) if cpu is not None and previous is not None else 0.0
+
+                stage = self._stage_of(stack)
+                if stage is None and not any(code.co_filename.startswith(_ROOT) for code in stack):
+                    # Idle pool threads and library housekeeping
+                    continue
+                stage = stage or 'other'
+                info = self.stages.setdefault(stage, {'samples': 0, 'thread_seconds': 0.0, 'cpu_seconds': 0.0})
+                info['samples'] += 1
+                info['thread_seconds'] += elapsed
+                info['cpu_seconds'] += min(cpu_delta, elapsed)
+
+                key = ';'.join([stage, names.get(ident, 'thread').split('_')[0]] + [_frame_label(c) for c in stack])
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stage_breakdown(self, stage_walls=None):
+        """Per stage: sampled thread time, CPU and wait seconds, plus the stage's wall time if known"""
+        stage_walls = stage_walls or {}
+        breakdown = {}
+        for stage in list(stage_walls) + [s for s in self.stages if s not in stage_walls]:
+            info = self.stages.get(stage, {'samples': 0, 'thread_seconds': 0.0, 'cpu_seconds': 0.0})
+            thread_seconds = info['thread_seconds']
+            cpu = info['cpu_seconds'] if self.cpu_clock else None
+            breakdown[stage] = {
+                'wall_seconds': stage_walls.get(stage),
+                'thread_seconds': round(thread_seconds, 3),
+                'cpu_seconds': round(cpu, 3) if cpu is not None else None,
+                'wait_seconds': round(thread_seconds - cpu, 3) if cpu is not None else None,
+                'cpu_share': round(cpu / thread_seconds, 3) if cpu is not None and thread_seconds else None
+            }
+        return breakdown
+
+    def top_functions(self, limit=15):
+        if self._stats is None:
+            return []
+        rows = sorted(self._stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                'function': f"{func[2]} ({os.path.basename(func[0])}:{func[1]})",
+                'calls': calls,
+                'own_seconds': round(own, 4),
+                'cumulative_seconds': round(cumulative, 4)
+            }
+            for func, (_, calls, own, cumulative, _) in rows[:limit]
+        ]
+
+    def summary(self, stage_walls=None):
+        return {
+            'wall_seconds': round(self.wall_seconds, 3) if self.wall_seconds is not None else None,
+            'cpu_seconds': round(self.cpu_seconds, 3) if self.cpu_seconds is not None else None,
+            'memory_peak_bytes': self.memory_peak,
+            'samples': self.samples,
+            'interval': self.interval,
+            'stages': self.stage_breakdown(stage_walls),
+            'top_functions': self.top_functions(),
+            'top_allocations': self.top_allocations
+        }
+
+    def format_stages(self, stage_walls=None, llm_seconds=None):
+        """The per-stage CPU / wait table; llm_seconds maps stage -> time spent inside LLM calls"""
+        llm_seconds = llm_seconds or {}
+        lines = [
+            f"PROFILE  wall {self.wall_seconds:.2f}s  process CPU {self.cpu_seconds:.2f}s"
+            + (f"  peak traced memory {self.memory_peak / 1e6:.1f} MB" if self.memory_peak is not None else ""),
+            f"{self.samples} samples every {self.interval * 1000:.0f}ms",
+            "",
+            f"{'stage':<12} {'wall s':>8} {'thread s':>9} {'cpu s':>8} {'wait s':>8} {'cpu %':>6} {'llm s':>8}",
+        ]
+
+        def cell(value, width, fmt="{:.2f}"):
+            return f"{'-' if value is None else fmt.format(value):>{width}}"
+
+        for stage, info in self.stage_breakdown(stage_walls).items():
+            share = info['cpu_share'] * 100 if info['cpu_share'] is not None else None
+            lines.append(
+                f"{stage:<12} {cell(info['wall_seconds'], 8)} {cell(info['thread_seconds'], 9)} "
+                f"{cell(info['cpu_seconds'], 8)} {cell(info['wait_seconds'], 8)} "
+                f"{cell(share, 6, '{:.0f}')} {cell(llm_seconds.get(stage), 8)}"
+            )
+        lines += [
+            "",
+            "thread s sums every thread working for the stage, so parallel work can exceed wall time;",
+            "wait s is thread time off the CPU (network, rate limiter, locks).",
+        ]
+        return "\n".join(lines)
+
+    def format_report(self, stage_walls=None, llm_seconds=None):
+        """format_stages() plus top allocations and the merged cProfile listing"""
+        lines = [self.format_stages(stage_walls, llm_seconds)]
+
+        if self.top_allocations:
+            lines += ["", "TOP ALLOCATIONS (live at the end of the run)"]
+            for alloc in self.top_allocations:
+                lines.append(f"  {alloc['size_bytes'] / 1024:>9.1f} KiB  {alloc['count']:>7}  {alloc['location']}")
+
+        if self._stats is not None:
+            out = io.StringIO()
+            stats = pstats.Stats(stream=out)
+            stats.add(self._stats)
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            lines += ["", "TOP FUNCTIONS BY CUMULATIVE TIME (all threads)", out.getvalue().strip()]
+        return "\n".join(lines) + "\n"
+
+    def write_collapsed(self, path):
+        """Stacks as 'stage;thread;outer;...;inner count' lines (flamegraph.pl, speedscope)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+    def write(self, base, stage_walls=None, llm_seconds=None):
+        """Write <base>.prof, <base>.collapsed and <base>.profile.txt; returns the paths"""
+        paths = {
+            'prof': f"{base}.prof",
+            'collapsed': f"{base}.collapsed",
+            'report': f"{base}.profile.txt"
+        }
+        self._stats.dump_stats(paths['prof'])
+        self.write_collapsed(paths['collapsed'])
+        with open(paths['report'], 'w', encoding='utf-8') as f:
+            f.write(self.format_report(stage_walls, llm_seconds))
+        return paths
+
+
+def stage_times(metrics_summary):
+    """({stage: wall seconds}, {stage: LLM call seconds}) from MetricsRecorder.summary()"""
+    walls = {name: info.get('wall_seconds') for name, info in metrics_summary['stages'].items()}
+    llm = {name: info.get('llm_seconds') for name, info in metrics_summary['stages'].items()}
+    return walls, llm
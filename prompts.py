@@ -25,6 +25,41 @@ Respond with:
 Be specific to {world_context}. No generic answers."""
 
 
+# Appended to the character prompt when a similar character was already
+# adapted to the same world; a short worked example, not a template to copy
+CHARACTER_SEED_EXAMPLE = """
+
+EXAMPLE: a similar character ({example_name}, the {example_role}) was adapted to
+{world_context} like this. Match its format and level of detail, but give this
+character their own name, position and story:
+{example_transformation}"""
+
+
+BATCH_CHARACTER_PROMPT = """You are helping adapt a classic story to a new setting.
+
+TARGET WORLD: {world_context}
+
+ORIGINAL CHARACTERS:
+{character_list}
+
+Create a new version of EVERY character above that:
+1. Keeps their role in the story
+2. Keeps their core traits but expressed through this world's lens
+3. Keeps their arc but using this world's circumstances
+4. Fits naturally into {world_context}
+
+Respond with ONLY a JSON array, one object per character in the same order,
+no other text. Each object must have exactly these string fields:
+- "original_name": the original name, copied exactly
+- "new_name": new name fitting the world
+- "new_position": new position/job in this world
+- "traits": how their traits manifest in this setting
+- "backstory": 2-3 sentences
+- "relationships": key relationships they'd have
+
+Be specific to {world_context}. No generic answers."""
+
+
 CONFLICT_TRANSFORM_PROMPT = """You are adapting a story's central conflict to a new world.
 
 ORIGINAL CONFLICT: {original_conflict}
@@ -101,6 +136,21 @@ Use the world's aesthetic throughout: {aesthetic}
 Write in a literary style appropriate for {world_name}."""
 
 
+TRANSITION_PROMPT = """You are smoothing the join between two consecutive scenes of an adapted story.
+
+Setting: {world_setting}
+
+END OF PREVIOUS SCENE:
+{previous_scene_end}
+
+START OF NEXT SCENE:
+{next_scene_start}
+
+Write a short bridge (1-3 sentences) that carries the reader from the first
+scene into the second: account for any jump in time or place and keep the
+same tense and point of view. Output only the bridge text."""
+
+
 VALIDATION_PROMPT = """Review this transformed story for thematic fidelity.
 
 ORIGINAL THEMES: {original_themes}
@@ -118,9 +168,9 @@ Check:
 Be specific and critical."""
 
 
-def get_character_prompt(character_mapping):
-    """Enter the character transformation prompt"""
-    return CHARACTER_TRANSFORM_PROMPT.format(
+def get_character_prompt(character_mapping, example=None):
+    """Enter the character transformation prompt, optionally seeded with a similar finished one"""
+    prompt = CHARACTER_TRANSFORM_PROMPT.format(
         original_name=character_mapping['original_name'],
         original_role=character_mapping['original_role'],
         original_traits=', '.join(character_mapping['original_traits']),
@@ -128,6 +178,28 @@ def get_character_prompt(character_mapping):
         world_context=character_mapping['world_context'],
         suggested_positions=', '.join(character_mapping['suggested_new_positions'])
     )
+    if example is None:
+        return prompt
+    return prompt + CHARACTER_SEED_EXAMPLE.format(
+        example_name=example['original_name'],
+        example_role=example['role'],
+        world_context=character_mapping['world_context'],
+        example_transformation=example['transformation']
+    )
+
+
+def get_batch_character_prompt(character_mappings):
+    """Enter the prompt that transforms every character in one call"""
+    character_list = "\n".join(
+        f"{i}. {m['original_name']} | role: {m['original_role']} | "
+        f"traits: {', '.join(m['original_traits'])} | arc: {m['original_arc']} | "
+        f"suggested positions: {', '.join(m['suggested_new_positions'])}"
+        for i, m in enumerate(character_mappings, 1)
+    )
+    return BATCH_CHARACTER_PROMPT.format(
+        world_context=character_mappings[0]['world_context'],
+        character_list=character_list
+    )
 
 
 def get_conflict_prompt(conflict_mapping, world_name):
@@ -156,6 +228,15 @@ def get_scene_prompt(plot_beat_mapping, source_info, theme, characters_text):
     )
 
 
+def get_transition_prompt(previous_scene, next_scene, world_setting, excerpt_chars=600):
+    """Enter the scene transition prompt"""
+    return TRANSITION_PROMPT.format(
+        world_setting=world_setting,
+        previous_scene_end=previous_scene[-excerpt_chars:],
+        next_scene_start=next_scene[:excerpt_chars]
+    )
+
+
 def get_assembly_prompt(source_info, world_info, characters, conflict, scenes):
     """Enter the final assembly prompt"""
     return STORY_ASSEMBLY_PROMPT.format(
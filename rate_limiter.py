@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out reservations instead of rejecting"""
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._level = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._level = min(self.capacity, self._level + elapsed * self.refill_per_second)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Take `amount` now and return how long the caller must wait before using it"""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+            if self._level >= 0:
+                return 0.0
+            # The balance may go negative: later callers queue up behind this one.
+            return -self._level / self.refill_per_second
+
+    def refund(self, amount):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+
+class RateLimiter:
+    """Client-side budget for requests and tokens per minute
+
+    A limit of 0 or None disables that budget.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+            if requests_per_minute else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+            if tokens_per_minute else None
+        )
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+
+    def _reserve(self, tokens):
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        with self._lock:
+            delay = max(delay, self._blocked_until - time.monotonic())
+            if delay > 0:
+                self.total_wait += delay
+        return max(delay, 0.0)
+
+    def acquire(self, tokens=0):
+        """Block until one request carrying `tokens` fits in the budget; returns seconds waited"""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self, tokens=0):
+        """acquire() for coroutines: waits without blocking the event loop"""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def settle(self, reserved, used):
+        """Give back the difference between the reserved token estimate and actual usage"""
+        if self.tokens is not None and reserved > used:
+            self.tokens.refund(reserved - used)
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
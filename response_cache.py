@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from checkpoint import write_atomic
+
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".cache" / "llm"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+class ResponseCache:
+    """On-disk LLM response cache keyed by a hash of the full request"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(request):
+        payload = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if self.max_age is not None and time.time() - stat.st_mtime > self.max_age:
+                self._remove(path, stat.st_size)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Touch on read so size-based eviction drops the least recently used entries
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry['response']
+
+    def put(self, key, response, request=None):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(
+            {'created': time.time(), 'request': request, 'response': response},
+            ensure_ascii=False
+        ).encode('utf-8')
+
+        old_size = path.stat().st_size if path.exists() else 0
+        write_atomic(path, lambda f: f.write(data), binary=True)
+
+        with self._lock:
+            size = self._current_size() + len(data) - old_size
+            self._size = size
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in self.directory.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def _remove(self, path, size):
+        try:
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones until under 90% of max_bytes"""
+        entries = sorted(self._entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9 if self.max_bytes is not None else None
+
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            over_budget = target is not None and total > target
+            if not expired and not over_budget:
+                continue
+            self._remove(path, size)
+            total -= size
+
+        with self._lock:
+            self._size = total
+
+    def clear(self):
+        for _, size, path in self._entries():
+            self._remove(path, size)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self._size
+            }
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+
+DEFAULT_STORE_PATH = Path(__file__).parent / "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    story_key TEXT NOT NULL,
+    world_key TEXT NOT NULL,
+    options TEXT NOT NULL,
+    created REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_pair ON results (story_key, world_key, created);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+SUMMARY_COLUMNS = "id, run_id, story_key, world_key, options, created, size"
+
+
+def _options_key(options):
+    return json.dumps(options or {}, sort_keys=True)
+
+
+class ResultStore:
+    """Append-only SQLite store of pipeline results, one zlib-compressed JSON row each
+
+    Rows are never updated or deleted: a rerun of the same pair adds a new
+    row, and lookups return the newest one.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def add(self, result, story_key, world_key, options=None):
+        """Append one result as soon as it is finished; returns the row id"""
+        data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO results (run_id, story_key, world_key, options, created, size, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (result['metadata']['run_id'], story_key, world_key, _options_key(options),
+                 time.time(), len(data), zlib.compress(data, 6))
+            )
+            return cursor.lastrowid
+
+    def _fetch_payload(self, where, params):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT payload FROM results WHERE {where} ORDER BY created DESC, id DESC LIMIT 1",
+                params
+            ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def get(self, run_id):
+        """Newest result stored under run_id, or None"""
+        return self._fetch_payload("run_id = ?", (run_id,))
+
+    def latest(self, story_key, world_key, options=None):
+        """Newest result for a pair; `options` narrows it to one set of pipeline options"""
+        if options is None:
+            return self._fetch_payload("story_key = ? AND world_key = ?", (story_key, world_key))
+        return self._fetch_payload(
+            "story_key = ? AND world_key = ? AND options = ?",
+            (story_key, world_key, _options_key(options))
+        )
+
+    def has(self, story_key, world_key, options=None):
+        query = "SELECT 1 FROM results WHERE story_key = ? AND world_key = ?"
+        params = [story_key, world_key]
+        if options is not None:
+            query += " AND options = ?"
+            params.append(_options_key(options))
+        with self._lock:
+            return self._db.execute(query + " LIMIT 1", params).fetchone() is not None
+
+    def find(self, story_key=None, world_key=None, limit=None):
+        """Row summaries (no payloads), newest first"""
+        query = f"SELECT {SUMMARY_COLUMNS} FROM results"
+        clauses, params = [], []
+        if story_key:
+            clauses.append("story_key = ?")
+            params.append(story_key)
+        if world_key:
+            clauses.append("world_key = ?")
+            params.append(world_key)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [
+            {
+                'id': row[0],
+                'run_id': row[1],
+                'story_key': row[2],
+                'world_key': row[3],
+                'options': json.loads(row[4]),
+                'created': row[5],
+                'size': row[6]
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
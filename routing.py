@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+
+from metrics import percentile
+
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+FALLBACK_MODEL = "llama-3.3-70b-versatile"
+
+# stage -> primary model, fallback model and the latency (seconds) after
+# which a primary attempt is abandoned for the fallback
+DEFAULT_ROUTES = {
+    'character': {'primary': DEFAULT_MODEL, 'fallback': FALLBACK_MODEL, 'latency_slo': 15.0},
+    # The whole cast in one request (character_mode='batched'): several times the output
+    'character_batch': {'primary': DEFAULT_MODEL, 'fallback': FALLBACK_MODEL, 'latency_slo': 60.0},
+    'conflict': {'primary': DEFAULT_MODEL, 'fallback': FALLBACK_MODEL, 'latency_slo': 15.0},
+    'assembly': {'primary': DEFAULT_MODEL, 'fallback': FALLBACK_MODEL, 'latency_slo': 60.0},
+    'validation': {'primary': DEFAULT_MODEL, 'fallback': FALLBACK_MODEL, 'latency_slo': 20.0},
+}
+
+# How long a primary that failed is skipped in favour of its fallback
+RATE_LIMIT_COOLDOWN = 30.0
+TIMEOUT_COOLDOWN = 10.0
+
+FAILOVER_REASONS = ('rate_limited', 'timeout')
+
+
+class Route:
+    def __init__(self, stage, primary, fallback=None, latency_slo=None):
+        self.stage = stage
+        self.primary = primary
+        self.fallback = fallback if fallback != primary else None
+        self.latency_slo = latency_slo
+
+    def as_dict(self):
+        return {'primary': self.primary, 'fallback': self.fallback, 'latency_slo': self.latency_slo}
+
+
+class Router:
+    """Picks the model for each call from its stage, skipping primaries that recently failed"""
+
+    def __init__(self, routes=None, default_model=DEFAULT_MODEL):
+        routes = DEFAULT_ROUTES if routes is None else routes
+        self.routes = {
+            stage: Route(stage, spec['primary'], spec.get('fallback'), spec.get('latency_slo'))
+            for stage, spec in routes.items()
+        }
+        self.default = Route(None, default_model)
+        self._cooldown_until = {}
+        self._lock = threading.Lock()
+
+    def route_for(self, stage):
+        return self.routes.get(stage, self.default)
+
+    def cooling_down(self, model):
+        with self._lock:
+            return self._cooldown_until.get(model, 0.0) > time.monotonic()
+
+    def choose(self, route):
+        """(model, timeout) for the next attempt on this route"""
+        if route.fallback and self.cooling_down(route.primary):
+            return route.fallback, None
+        # Without a fallback there is nothing to fail over to, so no deadline.
+        return route.primary, route.latency_slo if route.fallback else None
+
+    def failover(self, route, model, reason, cooldown=None):
+        """Note a failed attempt; True when the next attempt should go to the fallback"""
+        if model != route.primary or not route.fallback or reason not in FAILOVER_REASONS:
+            return False
+        if cooldown is None:
+            cooldown = RATE_LIMIT_COOLDOWN if reason == 'rate_limited' else TIMEOUT_COOLDOWN
+        with self._lock:
+            until = time.monotonic() + cooldown
+            self._cooldown_until[model] = max(self._cooldown_until.get(model, 0.0), until)
+        return True
+
+    def describe(self):
+        return {stage: route.as_dict() for stage, route in self.routes.items()}
+
+
+def load_routes(path):
+    """Routing table from a JSON file: {"stage": {"primary": ..., "fallback": ..., "latency_slo": ...}}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        routes = json.load(f)
+    for stage, spec in routes.items():
+        if not isinstance(spec, dict) or not spec.get('primary'):
+            raise ValueError(f"{path}: route for '{stage}' needs a 'primary' model")
+    return routes
+
+
+def routes_from_env():
+    path = os.getenv("STORY_ROUTES")
+    return load_routes(path) if path else None
+
+
+def summarize(calls, router=None):
+    """Failover decisions and per-model attempt latency from a run's call records"""
+    decisions = []
+    latencies = {}
+    outcomes = {}
+    for call in calls:
+        attempts = call.get('attempts') or []
+        for attempt, following in zip(attempts, attempts[1:]):
+            if attempt['outcome'] in FAILOVER_REASONS and following['model'] != attempt['model']:
+                decisions.append({
+                    'stage': call.get('route') or call.get('stage'),
+                    'from': attempt['model'],
+                    'to': following['model'],
+                    'reason': attempt['outcome']
+                })
+        for attempt in attempts:
+            if attempt['outcome'] == 'cache':
+                continue
+            latencies.setdefault(attempt['model'], []).append(attempt['seconds'])
+            counts = outcomes.setdefault(attempt['model'], {})
+            counts[attempt['outcome']] = counts.get(attempt['outcome'], 0) + 1
+
+    models = {
+        model: {
+            'attempts': len(values),
+            'outcomes': outcomes[model],
+            'p50': round(percentile(values, 50), 4),
+            'p95': round(percentile(values, 95), 4),
+            'max': round(max(values), 4)
+        }
+        for model, values in latencies.items()
+    }
+    return {
+        'routes': router.describe() if router is not None else None,
+        'decisions': decisions,
+        'models': models
+    }
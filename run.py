@@ -1,33 +1,33 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import os
+import re
 import sys
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from pipeline import StoryTransformationPipeline, save_output, print_story_only
+# Only light modules are imported up front: the pipeline pulls in the LLM
+# client and asyncio, which --list, --results and bad arguments never need.
 from transformer import load_story_data, load_world_data
+import catalog
+from checkpoint import CheckpointStore, DEFAULT_CHECKPOINT_DIR
+from result_store import ResultStore, DEFAULT_STORE_PATH
+from routing import load_routes
+from coordinator import DEFAULT_COORDINATOR_PATH, DEFAULT_PRIORITY, INTERACTIVE_PRIORITY
 
 
 def list_options():
-    stories_path = Path(__file__).parent / "data" / "stories.json"
-    with open(stories_path, 'r', encoding='utf-8') as f:
-        stories = json.load(f)
-    
-    worlds_path = Path(__file__).parent / "data" / "worlds.json"
-    with open(worlds_path, 'r', encoding='utf-8') as f:
-        worlds = json.load(f)
-    
     print("AVAILABLE SOURCE STORIES")
-    for key, story in stories.items():
+    for key, story in catalog.stories().summaries():
         print(f"\n  {key}")
         print(f"    Title: {story['title']}")
         print(f"    Author: {story['author']}")
         print(f"    Themes: {', '.join(story['core_themes'][:2])}...")
     
     print("\n AVAILABLE TARGET WORLDS")
-    for key, world in worlds.items():
+    for key, world in catalog.worlds().summaries():
         print(f"\n  {key}")
         print(f"    Setting: {world['name']}")
         print(f"    Era: {world['era']}")
@@ -54,17 +54,28 @@ def interactive_mode():
     return story, world
 
 
-def format_output_markdown(result):
+def format_markdown_header(source, target_world, themes):
     md = []
     
-    md.append(f"# {result['metadata']['source']} — Reimagined\n")
-    md.append(f"Original:** {result['metadata']['source']}")
-    md.append(f"New Setting:** {result['metadata']['target_world']}")
-    md.append(f"Core Themes:** {', '.join(result['metadata']['themes_preserved'])}\n")
+    md.append(f"# {source} — Reimagined\n")
+    md.append(f"Original:** {source}")
+    md.append(f"New Setting:** {target_world}")
+    md.append(f"Core Themes:** {', '.join(themes)}\n")
     
     md.append("---\n")
     
     md.append("## The Reimagined Story\n")
+    return "\n".join(md) + "\n"
+
+
+def format_output_markdown(result):
+    md = []
+    
+    md.append(format_markdown_header(
+        result['metadata']['source'],
+        result['metadata']['target_world'],
+        result['metadata']['themes_preserved']
+    ))
     md.append(result['story'])
     
     md.append("\n\n---\n")
@@ -88,6 +99,155 @@ def format_output_markdown(result):
     return "\n".join(md)
 
 
+def write_outputs(result, output_base):
+    from pipeline import save_output
+    json_file = f"{output_base}.json"
+    md_file = f"{output_base}.md"
+    
+    save_output(result, json_file)
+    
+    with open(md_file, 'w', encoding='utf-8') as f:
+        f.write(format_output_markdown(result))
+    print(f"Saved markdown to {md_file}")
+
+
+def hedge_threshold(value):
+    """--hedge accepts seconds (0.8) or a latency percentile (p95)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if not re.fullmatch(r'p\d+(\.\d+)?', value):
+        raise argparse.ArgumentTypeError(f"expected seconds or a percentile like p95, got '{value}'")
+    return value
+
+
+def hedge_rate(value):
+    rate = float(value)
+    if not 0 < rate <= 1:
+        raise argparse.ArgumentTypeError(f"must be in (0, 1], got {value}")
+    return rate
+
+
+def configure_similarity(args):
+    import similarity
+    similarity.configure_index(
+        os.getenv("STORY_SIMILARITY_INDEX") or similarity.DEFAULT_INDEX_PATH,
+        similarity.REUSE_THRESHOLD if args.reuse_threshold is None else args.reuse_threshold,
+        similarity.SEED_THRESHOLD if args.seed_threshold is None else args.seed_threshold
+    )
+
+
+def configure_client(args, routes=None):
+    from llm_client import (
+        configure_cache, configure_concurrency, configure_routing, configure_hedging, configure_coordinator
+    )
+    if args.no_cache:
+        configure_cache(enabled=False)
+    configure_concurrency(args.max_inflight)
+    if args.coordinator:
+        priority = args.priority
+        if priority is None:
+            # Single runs are someone waiting at a terminal; batches can yield to them.
+            priority = DEFAULT_PRIORITY if args.batch or args.all else INTERACTIVE_PRIORITY
+        configure_coordinator(args.coordinator, priority)
+    if routes is not None:
+        configure_routing(routes)
+    if args.hedge:
+        configure_hedging(args.hedge, max_rate=args.hedge_rate)
+
+
+def transform_one(args, story_key, world_key, run_id, store, checkpoint, routes, pipeline_options):
+    """Run one story/world pair and write its outputs; returns the pipeline, or None if the keys are bad"""
+    try:
+        story_data = load_story_data(story_key)
+        world_data = load_world_data(world_key)
+    except ValueError as e:
+        print(f"Error: {e}")
+        print("\nUse --list to see available options")
+        return None
+    
+    print(f"\nTransforming '{story_key}' into '{world_key}' setting...\n")
+    
+    from pipeline import StoryTransformationPipeline, print_story_only
+    from metrics import write_prometheus
+    configure_client(args, routes)
+    
+    output_base = args.output or (None if store else 'output')
+    live_md = None
+    on_story_chunk = None
+    if args.stream:
+        if output_base:
+            # The header is known up front, so the story can be appended to the
+            # markdown file as it arrives; the file is rewritten in full at the end.
+            live_md = open(f"{output_base}.md", 'w', encoding='utf-8')
+            live_md.write(format_markdown_header(
+                story_data['title'], world_data['name'], story_data['core_themes']
+            ))
+            live_md.flush()
+        
+        def on_story_chunk(chunk):
+            print(chunk, end='', flush=True)
+            if live_md is not None:
+                live_md.write(chunk)
+                live_md.flush()
+    
+    pipeline = StoryTransformationPipeline(
+        story_key=story_key,
+        world_key=world_key,
+        verbose=not args.quiet,
+        max_workers=args.workers,
+        on_story_chunk=on_story_chunk,
+        run_id=run_id,
+        checkpoint=checkpoint,
+        **pipeline_options
+    )
+    print(f"Run ID: {pipeline.run_id}\n")
+    
+    try:
+        result = pipeline.run()
+    except Exception as e:
+        print(f"\nError during transformation: {e}")
+        print("Make sure GROQ_API_KEY environment variable is set")
+        print(f"Finished stages are saved; continue with: python run.py --resume {pipeline.run_id}")
+        return pipeline
+    finally:
+        if live_md is not None:
+            live_md.close()
+            if args.quiet:
+                print()
+        if args.trace:
+            pipeline.metrics.write_jsonl(args.trace)
+        if args.prom:
+            write_prometheus(args.prom, [pipeline.metrics])
+    
+    if store is not None:
+        store.add(result, story_key, world_key, pipeline_options)
+        print(f"Stored run {pipeline.run_id} in {store.path} (export with --export {pipeline.run_id})")
+    if output_base:
+        write_outputs(result, output_base)
+    # The result is saved, so there is nothing left to resume.
+    checkpoint.discard(pipeline.run_id)
+    
+    if args.stream:
+        stats = result['metadata']['streaming'] or {}
+        print(f"Time to first token: {stats.get('time_to_first_token')}s, "
+              f"{stats.get('tokens_per_second')} tokens/sec")
+    else:
+        print_story_only(result)
+    return pipeline
+
+
+def write_profile(profiler, base, pipeline=None):
+    from profiling import stage_times
+    profiler.stop()
+    walls, llm = stage_times(pipeline.metrics.summary()) if pipeline is not None else ({}, {})
+    paths = profiler.write(base, walls, llm)
+    print()
+    print(profiler.format_stages(walls, llm))
+    print(f"Profile report: {paths['report']}  cProfile: {paths['prof']}  collapsed stacks: {paths['collapsed']}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Transform classic stories into new settings",
@@ -98,14 +258,58 @@ Examples:
     python run.py --story romeo_and_juliet --world silicon_valley_tech
     python run.py --story hamlet --world cyberpunk_megacity
     python run.py --story odyssey --world space_colony
+    python run.py --batch jobs.jsonl --concurrency 4
+    python run.py --all --output-dir outputs
+    python run.py --resume 3f9c2a1b7d4e
+    python run.py --all --store results.db
+    python run.py --export 3f9c2a1b7d4e --output hamlet_space
         """
     )
     
     parser.add_argument('--story', type=str, help='Source story key')
     parser.add_argument('--world', type=str, help='Target world key')
     parser.add_argument('--list', action='store_true', help='List available options')
-    parser.add_argument('--output', type=str, default='output', help='Output filename (without extension)')
+    parser.add_argument('--output', type=str, help='Output filename without extension (default: output, or none with --store)')
     parser.add_argument('--quiet', action='store_true', help='Suppress progress messages')
+    parser.add_argument('--batch', type=str, help='JSONL job file, one {"story": ..., "world": ...} per line')
+    parser.add_argument('--all', action='store_true', help='Run every story against every world')
+    parser.add_argument('--output-dir', type=str, default='outputs', help='Directory for batch results')
+    parser.add_argument('--concurrency', type=int, default=4, help='Batch jobs running at once')
+    parser.add_argument('--max-inflight', type=int, help='Cap on concurrent API requests across all jobs')
+    parser.add_argument('--trace', type=str, help='Append per-stage and per-call metrics to this JSON lines file')
+    parser.add_argument('--prom', type=str, help='Write metrics to this Prometheus textfile')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the API instead of reusing cached structured responses')
+    parser.add_argument('--stream', action='store_true', help='Print the story as it is generated and append it to the markdown file live')
+    parser.add_argument('--workers', type=int, default=4, help='Max concurrent character transformations (1 = sequential)')
+    parser.add_argument('--character-mode', choices=['parallel', 'batched'], default='parallel',
+                        help='parallel: one call per character; batched: one JSON call for the whole cast, with per-character fallback')
+    parser.add_argument('--similarity', choices=['off', 'reuse', 'seed'], default='off',
+                        help='Reuse (or pass as an example) earlier transformations of similar characters in the same world')
+    parser.add_argument('--reuse-threshold', type=float, help='With --similarity reuse, similarity needed to reuse as is (default 0.8)')
+    parser.add_argument('--seed-threshold', type=float, help='With --similarity, similarity needed to pass as an example (default 0.12)')
+    parser.add_argument('--story-mode', choices=['assembly', 'scenes'], default='assembly',
+                        help='assembly: one call writes the whole story; scenes: one concurrent call per plot beat')
+    parser.add_argument('--smooth', action='store_true', help='With --story-mode scenes, add short bridges between scenes')
+    parser.add_argument('--validation', choices=['llm', 'gate', 'local'], default='llm',
+                        help='llm: always ask the model; gate: skip it on a clear local pass and rewrite once on a clear fail; local: heuristic check only')
+    parser.add_argument('--resume', type=str, metavar='RUN_ID', help='Continue an earlier run from its last finished stage')
+    parser.add_argument('--store', nargs='?', const=str(DEFAULT_STORE_PATH), metavar='PATH',
+                        help=f'Append results to a SQLite result store (default {DEFAULT_STORE_PATH.name}) instead of overwriting output files')
+    parser.add_argument('--export', type=str, metavar='RUN_ID', help='Write a stored result to --output as JSON and markdown')
+    parser.add_argument('--results', action='store_true', help='List stored results (filter with --story/--world)')
+    parser.add_argument('--hedge', nargs='?', const='p95', type=hedge_threshold, metavar='THRESHOLD',
+                        help='Send a duplicate of structured calls slower than THRESHOLD (seconds or a percentile, default p95)')
+    parser.add_argument('--hedge-rate', type=hedge_rate, default=0.1,
+                        help='With --hedge, max fraction of calls that may be duplicated (default 0.1)')
+    parser.add_argument('--coordinator', nargs='?', const=str(DEFAULT_COORDINATOR_PATH), metavar='PATH',
+                        help='Share the rate budget with other processes through this SQLite file (default .coordinator.db)')
+    parser.add_argument('--priority', type=int,
+                        help='With --coordinator, queue priority of this process (default 10 for single runs, 0 for batches)')
+    parser.add_argument('--profile', nargs='?', const='', metavar='BASE',
+                        help='Profile CPU, memory and wait time; writes BASE.prof, BASE.collapsed and BASE.profile.txt (default BASE: --output)')
+    parser.add_argument('--routes', type=str, metavar='PATH',
+                        help='JSON routing table: per-stage primary/fallback model and latency SLO')
+    parser.add_argument('--checkpoint-dir', type=str, default=str(DEFAULT_CHECKPOINT_DIR), help='Where stage checkpoints are kept')
     
     args = parser.parse_args()
     
@@ -113,48 +317,108 @@ Examples:
         list_options()
         return
     
-    if not args.story or not args.world:
-        result = interactive_mode()
-        if result is None:
-            return
-        story_key, world_key = result
-    else:
-        story_key = args.story
-        world_key = args.world
+    store = None
+    if args.store or args.export or args.results:
+        store = ResultStore(args.store or DEFAULT_STORE_PATH)
     
-    try:
-        load_story_data(story_key)
-        load_world_data(world_key)
-    except ValueError as e:
-        print(f"Error: {e}")
-        print("\nUse --list to see available options")
+    if args.results:
+        for row in store.find(args.story, args.world):
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(row['created']))
+            print(f"{row['run_id']}  {created}  {row['story_key']} x {row['world_key']}  {row['options']}")
         return
     
-    print(f"\nTransforming '{story_key}' into '{world_key}' setting...\n")
+    if args.export:
+        result = store.get(args.export)
+        if result is None:
+            print(f"Error: no stored result for run '{args.export}' in {store.path}")
+            return
+        write_outputs(result, args.output or args.export)
+        return
     
-    pipeline = StoryTransformationPipeline(
-        story_key=story_key,
-        world_key=world_key,
-        verbose=not args.quiet
-    )
+    routes = None
+    if args.routes:
+        try:
+            routes = load_routes(args.routes)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return
     
-    try:
-        result = pipeline.run()
-    except Exception as e:
-        print(f"\nError during transformation: {e}")
-        print("Make sure GROQ_API_KEY environment variable is set")
-        return
+    if args.reuse_threshold is not None or args.seed_threshold is not None:
+        try:
+            configure_similarity(args)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
     
-    json_file = f"{args.output}.json"
-    md_file = f"{args.output}.md"
+    checkpoint = CheckpointStore(args.checkpoint_dir)
+    checkpoint.prune()
+    pipeline_options = {
+        'story_mode': args.story_mode,
+        'smooth_transitions': args.smooth,
+        'validation_mode': args.validation,
+        'character_mode': args.character_mode,
+        'similarity_policy': args.similarity
+    }
     
-    save_output(result, json_file)
+    if args.batch or args.all:
+        if args.profile is not None:
+            print("Error: --profile works with single runs, not --batch/--all")
+            return
+        from batch import load_jobs, all_jobs, run_batch, print_summary
+        try:
+            jobs = load_jobs(args.batch) if args.batch else all_jobs()
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return
+        configure_client(args, routes)
+        summary = run_batch(
+            jobs,
+            output_dir=args.output_dir,
+            write_result=write_outputs,
+            concurrency=args.concurrency,
+            character_workers=args.workers,
+            verbose=not args.quiet,
+            trace_path=args.trace,
+            prom_path=args.prom,
+            checkpoint=checkpoint,
+            pipeline_options=pipeline_options,
+            store=store
+        )
+        print_summary(summary)
+        return
     
-    with open(md_file, 'w', encoding='utf-8') as f:
-        f.write(format_output_markdown(result))
-    print(f"Saved markdown to {md_file}")
+    run_id = None
+    if args.resume:
+        try:
+            manifest = checkpoint.manifest(args.resume)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        run_id = args.resume
+        story_key = manifest['story_key']
+        world_key = manifest['world_key']
+        # Finished stages were produced with the original options, so the rest must match them.
+        pipeline_options.update(manifest.get('options') or {})
+    elif not args.story or not args.world:
+        result = interactive_mode()
+        if result is None:
+            return
+        story_key, world_key = result
+    else:
+        story_key = args.story
+        world_key = args.world
     
-    print_story_only(result)
+    profiler = None
+    if args.profile is not None:
+        from pipeline import STAGE_FUNCTIONS
+        from profiling import Profiler
+        profiler = Profiler(STAGE_FUNCTIONS).start()
+    pipeline = None
+    try:
+        pipeline = transform_one(args, story_key, world_key, run_id, store, checkpoint, routes, pipeline_options)
+    finally:
+        if profiler is not None:
+            write_profile(profiler, args.profile or args.output or 'output', pipeline)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """A pipeline step plus the pipeline attributes it reads and writes"""
+
+    def __init__(self, name, func, inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+class StageScheduler:
+    """Runs stages as a dependency graph, starting every stage whose inputs are ready"""
+
+    def __init__(self, stages, max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers or len(self.stages)
+        self.producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(
+                        f"Output '{output}' is produced by both "
+                        f"'{self.producers[output]}' and '{stage.name}'"
+                    )
+                self.producers[output] = stage.name
+        self.timings = {}
+        self._check_acyclic()
+
+    def dependencies(self, name):
+        return [
+            self.producers[item]
+            for item in self.stages[name].inputs
+            if item in self.producers
+        ]
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.dependencies(name):
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _pending(self, available):
+        ready_items = set(available)
+        pending = {
+            name for name, stage in self.stages.items()
+            if not set(stage.outputs) <= ready_items or not stage.outputs
+        }
+        for name, stage in self.stages.items():
+            missing = [
+                item for item in stage.inputs
+                if item not in self.producers and item not in ready_items
+            ]
+            if name in pending and missing:
+                raise ValueError(f"Stage '{name}' needs {missing}, which nothing produces")
+        return ready_items, pending
+
+    def run(self, available=()):
+        """Run all stages; `available` names outputs that already exist"""
+        ready_items, pending = self._pending(available)
+
+        self.timings = {}
+        self._origin = time.perf_counter()
+        running = {}
+        error = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    for name in sorted(pending):
+                        if set(self.stages[name].inputs) <= ready_items:
+                            pending.discard(name)
+                            context = contextvars.copy_context()
+                            running[executor.submit(context.run, self._run_stage, name)] = name
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                        continue
+                    ready_items.update(self.stages[name].outputs)
+
+        if error is not None:
+            raise error
+        return self.timings
+
+    async def arun(self, available=()):
+        """run() for stages whose funcs are coroutine functions
+
+        All stages share the caller's event loop. If a stage fails (or arun
+        is cancelled) the stages still running are cancelled.
+        """
+        ready_items, pending = self._pending(available)
+
+        self.timings = {}
+        self._origin = time.perf_counter()
+        running = {}
+        try:
+            while pending or running:
+                for name in sorted(pending):
+                    if set(self.stages[name].inputs) <= ready_items:
+                        pending.discard(name)
+                        running[asyncio.ensure_future(self._arun_stage(name))] = name
+
+                if not running:
+                    break
+
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    name = running.pop(task)
+                    task.result()
+                    ready_items.update(self.stages[name].outputs)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return self.timings
+
+    def _record_timing(self, name, start):
+        end = time.perf_counter() - self._origin
+        self.timings[name] = {
+            'start': round(start, 4),
+            'end': round(end, 4),
+            'duration': round(end - start, 4)
+        }
+
+    def _run_stage(self, name):
+        start = time.perf_counter() - self._origin
+        try:
+            return self.stages[name].func()
+        finally:
+            self._record_timing(name, start)
+
+    async def _arun_stage(self, name):
+        start = time.perf_counter() - self._origin
+        try:
+            return await self.stages[name].func()
+        finally:
+            self._record_timing(name, start)
+
+    def critical_path(self):
+        """Chain of stages that determined the finish time, walking back from the last one"""
+        if not self.timings:
+            return []
+        current = max(self.timings, key=lambda n: self.timings[n]['end'])
+        path = [current]
+        while True:
+            deps = [d for d in self.dependencies(current) if d in self.timings]
+            if not deps:
+                break
+            current = max(deps, key=lambda n: self.timings[n]['end'])
+            path.append(current)
+        return list(reversed(path))
+
+    def report(self):
+        path = self.critical_path()
+        return {
+            'stages': dict(self.timings),
+            'critical_path': path,
+            'critical_path_seconds': round(
+                sum(self.timings[name]['duration'] for name in path), 4
+            ),
+            'wall_seconds': round(
+                max((t['end'] for t in self.timings.values()), default=0.0), 4
+            )
+        }
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""Long-running HTTP service around StoryTransformationPipeline
+
+    POST /jobs               {"story": ..., "world": ..., "options": {...}} -> job id
+    GET  /jobs/<id>          status, and the full result once done
+    GET  /jobs/<id>/stream   server-sent events: story chunks, then the result
+    GET  /health             queue depth and job counts
+
+Identical requests (same story, world and options) made while a matching
+job is still queued or running get that job's id instead of a new run.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import llm_client
+from pipeline import StoryTransformationPipeline
+from transformer import load_story_data, load_world_data
+
+
+# Pipeline keyword arguments a client may set per job
+JOB_OPTIONS = ('story_mode', 'smooth_transitions', 'validation_mode', 'character_mode', 'similarity_policy')
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_KEEP_FINISHED = 256
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """One pipeline run plus the story chunks streamed so far"""
+
+    def __init__(self, key, story_key, world_key, options):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.story_key = story_key
+        self.world_key = world_key
+        self.options = options
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.submitters = 1
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.chunks = []
+        self.changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'error')
+
+    def add_chunk(self, chunk):
+        with self.changed:
+            self.chunks.append(chunk)
+            self.changed.notify_all()
+
+    def set_status(self, status, result=None, error=None):
+        with self.changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            if status == 'running':
+                self.started = time.time()
+            elif self.done:
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    def describe(self, include_result=True):
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'story': self.story_key,
+            'world': self.world_key,
+            'options': self.options,
+            'submitters': self.submitters,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error
+        }
+        if include_result and self.status == 'done':
+            info['result'] = self.result
+        return info
+
+
+class JobManager:
+    """Bounded job queue with worker threads and coalescing of identical jobs"""
+
+    def __init__(self, workers=2, queue_size=DEFAULT_QUEUE_SIZE, character_workers=4,
+                 keep_finished=DEFAULT_KEEP_FINISHED):
+        self.character_workers = character_workers
+        self.keep_finished = keep_finished
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.inflight = {}
+        self.coalesced = 0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    @staticmethod
+    def job_key(story_key, world_key, options):
+        return json.dumps([story_key, world_key, options], sort_keys=True)
+
+    def submit(self, story_key, world_key, options=None):
+        """Queue a job, or join the matching in-flight one; returns (job, coalesced)"""
+        options = dict(options or {})
+        unknown = sorted(set(options) - set(JOB_OPTIONS))
+        if unknown:
+            raise ValueError(f"Unknown options {unknown}. Available: {list(JOB_OPTIONS)}")
+        load_story_data(story_key)
+        load_world_data(world_key)
+        # Catch bad option values now rather than in a worker.
+        StoryTransformationPipeline(story_key, world_key, verbose=False, **options)
+
+        key = self.job_key(story_key, world_key, options)
+        with self.lock:
+            job = self.inflight.get(key)
+            if job is not None:
+                job.submitters += 1
+                self.coalesced += 1
+                return job, True
+            job = Job(key, story_key, world_key, options)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"Job queue is full ({self.queue.maxsize} waiting)")
+            self.inflight[key] = job
+            self.jobs[job.id] = job
+            self._trim_finished()
+            return job, False
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _trim_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            job.set_status('running')
+            # A streamed story can't be taken back, and 'gate' may rewrite it,
+            # so gate jobs only deliver the finished result.
+            streaming = job.options.get('validation_mode') != 'gate'
+            try:
+                pipeline = StoryTransformationPipeline(
+                    job.story_key,
+                    job.world_key,
+                    verbose=False,
+                    max_workers=self.character_workers,
+                    on_story_chunk=job.add_chunk if streaming else None,
+                    **job.options
+                )
+                result = pipeline.run()
+            except Exception as e:
+                with self.lock:
+                    self.inflight.pop(job.key, None)
+                job.set_status('error', error=str(e))
+            else:
+                with self.lock:
+                    self.inflight.pop(job.key, None)
+                job.set_status('done', result=result)
+            finally:
+                self.queue.task_done()
+
+    def health(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                'queued': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'workers': len(self.threads),
+                'jobs': counts,
+                'inflight': len(self.inflight),
+                'coalesced': self.coalesced
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        manager = self.server.manager
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if parts == ['health']:
+            return self._send_json(200, manager.health())
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = manager.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': f"Unknown job '{parts[1]}'"})
+            if len(parts) == 2:
+                return self._send_json(200, job.describe())
+            if parts[2] == 'stream':
+                return self._stream(job)
+        self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': f"Unknown path {self.path}"})
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': 'Body must be JSON'})
+        if not isinstance(body, dict) or not body.get('story') or not body.get('world'):
+            return self._send_json(400, {'error': "Body needs 'story' and 'world'"})
+        try:
+            job, coalesced = self.server.manager.submit(
+                body['story'], body['world'], body.get('options')
+            )
+        except QueueFull as e:
+            return self._send_json(503, {'error': str(e)}, headers={'Retry-After': '5'})
+        except (ValueError, TypeError) as e:
+            return self._send_json(400, {'error': str(e)})
+        self._send_json(202, {
+            'job_id': job.id,
+            'status': job.status,
+            'coalesced': coalesced,
+            'poll': f"/jobs/{job.id}",
+            'stream': f"/jobs/{job.id}/stream"
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_event(self, event, payload):
+        data = f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8')
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, job):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        # Chunks are kept on the job, so a client that joins late (or a
+        # coalesced duplicate) replays the story from the start.
+        sent = 0
+        status = None
+        try:
+            while True:
+                with job.changed:
+                    while sent == len(job.chunks) and status == job.status and not job.done:
+                        job.changed.wait(timeout=15)
+                    chunks = job.chunks[sent:]
+                    current = job.status
+                for chunk in chunks:
+                    self._write_event('chunk', {'text': chunk})
+                sent += len(chunks)
+                if current != status:
+                    status = current
+                    self._write_event('status', {'status': status})
+                if job.done and sent == len(job.chunks):
+                    break
+            self._write_event('done', job.describe())
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class StoryService:
+    """HTTP server plus job manager; use as a context manager or call start()/stop()"""
+
+    def __init__(self, host='127.0.0.1', port=8080, workers=2, queue_size=DEFAULT_QUEUE_SIZE,
+                 character_workers=4, verbose=False):
+        self.manager = JobManager(workers, queue_size, character_workers)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.manager = self.manager
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _warm_up(self):
+        # Build the shared client up front so the first job doesn't pay for it.
+        llm_client.get_client()
+        self.manager.start()
+
+    def start(self):
+        self._warm_up()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._warm_up()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve story transformations over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=2, help='Jobs running at once')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help='Jobs allowed to wait before new ones get 503')
+    parser.add_argument('--character-workers', type=int, default=4, help='Concurrent character transformations per job')
+    parser.add_argument('--max-inflight', type=int, help='Cap on concurrent API requests across all jobs')
+    parser.add_argument('--coordinator', nargs='?', const='', metavar='PATH',
+                        help='Share the rate budget with other processes through this SQLite file')
+    parser.add_argument('--priority', type=int, help='With --coordinator, queue priority (default 10: requests wait on a person)')
+    parser.add_argument('--verbose', action='store_true', help='Log every HTTP request')
+    args = parser.parse_args()
+
+    llm_client.configure_concurrency(args.max_inflight)
+    if args.coordinator is not None:
+        from coordinator import INTERACTIVE_PRIORITY
+        priority = INTERACTIVE_PRIORITY if args.priority is None else args.priority
+        llm_client.configure_coordinator(args.coordinator or None, priority)
+    service = StoryService(args.host, args.port, args.workers, args.queue_size,
+                           args.character_workers, args.verbose)
+    print(f"Story service listening on {service.url}")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from checkpoint import write_atomic
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: appends and compaction are not coordinated across processes
+    fcntl = None
+
+
+SIMILARITY_POLICIES = ('off', 'reuse', 'seed')
+
+# Estimated Jaccard similarity of (role, traits, arc) within the same world.
+# At or above REUSE_THRESHOLD an earlier transformation is used as is; at or
+# above SEED_THRESHOLD it is shown to the model as a worked example. In
+# data/stories.json characters sharing only a role score 0.14-0.3, and
+# characters with different roles stay under 0.1.
+REUSE_THRESHOLD = 0.8
+SEED_THRESHOLD = 0.12
+
+# The role is one word against several for traits and arc, so it is repeated
+# to make a shared role count for about as much as a shared trait list
+ROLE_WEIGHT = 3
+
+NUM_PERM = 128
+# 64 bands of 2 rows: a pair at similarity 0.2 shares a band with ~93% odds
+BANDS = 64
+ROWS = NUM_PERM // BANDS
+
+# Kept entries per world; the least recently added or matched go first
+MAX_ENTRIES_PER_WORLD = 2000
+# The file is rewritten once it has more than twice as many lines as kept
+# entries (and at least this many)
+COMPACT_MIN_LINES = 1000
+
+DEFAULT_INDEX_PATH = Path(__file__).parent / ".cache" / "similarity.jsonl"
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = frozenset(
+    "a an the and or of to from for in on at by with into who is as be their them they his her "
+    "its it that this than then someone something".split()
+)
+
+
+def _words(text):
+    return [w for w in re.findall(r"[a-z0-9']+", str(text).lower()) if w not in STOPWORDS]
+
+
+def character_features(char_mapping):
+    """Shingles of a character's role, traits and arc (the name and world are left out)"""
+    features = {
+        f"role:{w}#{i}" for w in _words(char_mapping['original_role']) for i in range(ROLE_WEIGHT)
+    }
+    for trait in char_mapping['original_traits']:
+        features.update(f"trait:{w}" for w in _words(trait))
+    features.update(f"arc:{w}" for w in _words(char_mapping['original_arc']))
+    return features
+
+
+def _hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash(features):
+    hashes = [_hash(f) for f in features] or [0]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by every process appending to or compacting `path`"""
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{path}.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _bands(signature):
+    return [(i, tuple(signature[i * ROWS:(i + 1) * ROWS])) for i in range(BANDS)]
+
+
+class SimilarityIndex:
+    """MinHash/LSH index of finished character transformations, per world
+
+    Entries are appended to a JSON lines file (when `path` is set) so later
+    runs and other story x world pairs can find them. Each world keeps at
+    most `max_per_world` entries, dropping the least recently added or
+    matched; the file is rewritten with just the kept entries once most of
+    its lines are stale.
+    """
+
+    def __init__(self, path=None, reuse_threshold=REUSE_THRESHOLD, seed_threshold=SEED_THRESHOLD,
+                 max_per_world=MAX_ENTRIES_PER_WORLD):
+        if not 0 < seed_threshold <= reuse_threshold <= 1:
+            raise ValueError(
+                f"Need 0 < seed_threshold <= reuse_threshold <= 1, got {seed_threshold} and {reuse_threshold}"
+            )
+        self.path = Path(path) if path else None
+        self.reuse_threshold = reuse_threshold
+        self.seed_threshold = seed_threshold
+        self.max_per_world = max_per_world
+        self.entries = {}
+        self._ids = {}
+        self._worlds = {}
+        self._buckets = {}
+        self._next_id = 0
+        self._file_lines = 0
+        self._file_offset = 0
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'reused': 0, 'seeded': 0, 'misses': 0, 'added': 0, 'evicted': 0}
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _read_file(self, offset=0):
+        """(entries, line count, end offset) for the file from byte `offset` on"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        entries = []
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn last line from an interrupted write
+                continue
+        return entries, len(lines), offset + len(data)
+
+    def _load(self):
+        entries, self._file_lines, self._file_offset = self._read_file()
+        for entry in entries:
+            self._insert(entry)
+        self._compact_if_stale()
+
+    def _remove(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        del self._ids[(entry['story'], entry['world'], entry['original_name'])]
+        del self._worlds[entry['world']][entry_id]
+        for band in _bands(entry['signature']):
+            bucket = self._buckets[(entry['world'], band)]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[(entry['world'], band)]
+
+    def _insert(self, entry):
+        # A rerun of the same character replaces its earlier transformation.
+        old_id = self._ids.get((entry['story'], entry['world'], entry['original_name']))
+        if old_id is not None:
+            self._remove(old_id)
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = entry
+        self._ids[(entry['story'], entry['world'], entry['original_name'])] = entry_id
+        world = self._worlds.setdefault(entry['world'], OrderedDict())
+        world[entry_id] = None
+        for band in _bands(entry['signature']):
+            self._buckets.setdefault((entry['world'], band), set()).add(entry_id)
+        while len(world) > self.max_per_world:
+            self._remove(next(iter(world)))
+            self._stats['evicted'] += 1
+
+    def _compact_if_stale(self):
+        if self.path is None or self._file_lines <= max(COMPACT_MIN_LINES, 2 * len(self.entries)):
+            return
+        with _file_lock(self.path):
+            # Other processes may have appended since this one read the file;
+            # the rewrite replaces it, so their entries are merged in first.
+            entries, _, _ = self._read_file(self._file_offset) if self.path.exists() else ([], 0, 0)
+            for entry in entries:
+                entry_id = self._ids.get((entry['story'], entry['world'], entry['original_name']))
+                if entry_id is None or self.entries[entry_id] != entry:
+                    self._insert(entry)
+            # Oldest first per world, so a reload rebuilds the same recency order.
+            ordered = [self.entries[i] for world in self._worlds.values() for i in world]
+
+            def write(f):
+                for entry in ordered:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            write_atomic(self.path, write)
+            self._file_offset = self.path.stat().st_size
+        self._file_lines = len(ordered)
+
+    def add(self, story_key, world_key, char_mapping, transformation):
+        """Index a finished transformation of one character"""
+        entry = {
+            'story': story_key,
+            'world': world_key,
+            'original_name': char_mapping['original_name'],
+            'role': char_mapping['original_role'],
+            'transformation': transformation,
+            'signature': minhash(character_features(char_mapping))
+        }
+        with self._lock:
+            self._insert(entry)
+            self._stats['added'] += 1
+            if self.path is not None:
+                with _file_lock(self.path):
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._file_lines += 1
+                self._compact_if_stale()
+
+    def lookup(self, story_key, world_key, char_mapping, policy='reuse', exclude=()):
+        """(action, entry, similarity) for a character about to be transformed
+
+        action is 'reuse', 'seed' or None. Characters from the same story are
+        never matched, since two of its cast must not become the same person,
+        and neither are entry positions in `exclude`.
+        """
+        signature = minhash(character_features(char_mapping))
+        with self._lock:
+            candidates = set()
+            for band in _bands(signature):
+                candidates.update(self._buckets.get((world_key, band), ()))
+            best, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self.entries[entry_id]
+                if entry['story'] == story_key or entry_id in exclude:
+                    continue
+                score = estimate_similarity(signature, entry['signature'])
+                if score > best_score:
+                    best, best_score = entry_id, score
+
+            self._stats['lookups'] += 1
+            action = None
+            if best is not None and policy == 'reuse' and best_score >= self.reuse_threshold:
+                action = 'reuse'
+            elif best is not None and best_score >= self.seed_threshold:
+                action = 'seed'
+            self._stats['reused' if action == 'reuse' else 'seeded' if action == 'seed' else 'misses'] += 1
+            if action is None:
+                return None, None, best_score
+            # A match keeps the entry from being the next one evicted.
+            self._worlds[world_key].move_to_end(best)
+            return action, dict(self.entries[best], position=best), round(best_score, 3)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self.entries)
+        lookups = stats['lookups']
+        stats['hit_rate'] = round((stats['reused'] + stats['seeded']) / lookups, 3) if lookups else 0.0
+        stats['reuse_threshold'] = self.reuse_threshold
+        stats['seed_threshold'] = self.seed_threshold
+        stats['max_per_world'] = self.max_per_world
+        return stats
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def configure_index(path=None, reuse_threshold=REUSE_THRESHOLD, seed_threshold=SEED_THRESHOLD,
+                    max_per_world=MAX_ENTRIES_PER_WORLD):
+    """Replace the shared index; path=None keeps it in memory only"""
+    global _index
+    with _index_lock:
+        _index = SimilarityIndex(path, reuse_threshold, seed_threshold, max_per_world)
+    return _index
+
+
+def get_index():
+    """The shared index, persisted to STORY_SIMILARITY_INDEX (default .cache/similarity.jsonl)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex(os.getenv("STORY_SIMILARITY_INDEX") or DEFAULT_INDEX_PATH)
+        return _index
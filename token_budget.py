@@ -0,0 +1,111 @@
+import math
+import re
+
+
+CHARS_PER_TOKEN = 4.0
+TOKENS_PER_WORD = 1.35
+OUTPUT_HEADROOM = 1.25
+
+# Expected length of each stage's answer, in words
+STAGE_OUTPUT_WORDS = {
+    'character': 300,
+    'conflict': 350,
+    'assembly': 1200,
+    'scene': 400,
+    'transition': 60,
+    'validation': 300,
+}
+
+# Token budgets for the variable parts of the larger prompts
+CONFLICT_INPUT_TOKENS = 400
+VALIDATION_STORY_TOKENS = 3000
+TRAITS_MAX_CHARS = 160
+
+# Labels the character prompt asks for, matched loosely against the reply
+CHARACTER_FIELDS = {
+    'name': re.compile(r'^new\s+name\b', re.IGNORECASE),
+    'position': re.compile(r'^(new\s+)?(position|job|role)\b', re.IGNORECASE),
+    'traits': re.compile(r'^(how\s+)?(their\s+)?traits?\b', re.IGNORECASE),
+}
+_LABEL_LINE = re.compile(r'^[\s#>*\-\d.)]*\**\s*([^:*\n]{2,60}?)\s*\**\s*[:\-–]\s*\**\s*(.*)$')
+_HEADING_LINE = re.compile(r'^(?:#+\s*|\*\*)([^:*#\n]{2,60}?)\**\s*$')
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about 4 characters per token for English prose)"""
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def max_tokens_for(stage, scale=1):
+    """max_tokens for a stage, sized from its expected output length plus headroom"""
+    words = STAGE_OUTPUT_WORDS[stage] * scale
+    return int(math.ceil(words * TOKENS_PER_WORD * OUTPUT_HEADROOM))
+
+
+def fit_to_tokens(text, max_tokens, marker="\n[...]\n"):
+    """Trim text to roughly max_tokens, keeping the beginning and the end"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = int(max_tokens * CHARS_PER_TOKEN) - len(marker)
+    head = keep * 2 // 3
+    tail = keep - head
+    return text[:head].rstrip() + marker + text[-tail:].lstrip()
+
+
+def _clean(value):
+    return value.strip().strip('*').strip()
+
+
+def compact_character(original_name, transformation):
+    """Pull name/position/traits out of a free-text character transformation
+
+    Returns a dict with 'original' plus whichever of 'name', 'position' and
+    'traits' could be found. If none were found, 'summary' holds a trimmed
+    copy of the text instead.
+    """
+    compact = {'original': original_name}
+    lines = [line.strip() for line in transformation.splitlines()]
+
+    for i, line in enumerate(lines):
+        match = _LABEL_LINE.match(line)
+        if match:
+            label, value = _clean(match.group(1)), _clean(match.group(2))
+        else:
+            match = _HEADING_LINE.match(line)
+            if not match:
+                continue
+            label, value = _clean(match.group(1)), ''
+        for field, pattern in CHARACTER_FIELDS.items():
+            if field in compact or not pattern.match(label):
+                continue
+            if not value:
+                # "### New Name" style headings put the value on the next line
+                value = next((_clean(l) for l in lines[i + 1:] if l), '')
+            if value:
+                compact[field] = value
+            break
+
+    if 'traits' in compact and len(compact['traits']) > TRAITS_MAX_CHARS:
+        compact['traits'] = compact['traits'][:TRAITS_MAX_CHARS].rsplit(' ', 1)[0] + '...'
+    if len(compact) == 1:
+        summary = ' '.join(l for l in lines if l)
+        compact['summary'] = fit_to_tokens(summary, 80, marker='...')
+    return compact
+
+
+def format_character_summaries(compact_characters):
+    """One short line per character for assembly and scene prompts"""
+    lines = []
+    for c in compact_characters:
+        if 'summary' in c:
+            lines.append(f"- {c['original']}: {c['summary']}")
+            continue
+        line = f"- {c['original']} -> {c.get('name', 'unnamed')}"
+        if c.get('position'):
+            line += f" ({c['position']})"
+        if c.get('traits'):
+            line += f": {c['traits']}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -1,45 +1,82 @@
 import json
-from pathlib import Path
+from functools import lru_cache
+import catalog
+
+
+# World list and slice each narrative role draws its suggested positions from
+ROLE_POSITION_SOURCES = {
+    'protagonist': ('social_hierarchy', 1, 3),
+    'antagonist': ('power_structures', None, 2),
+    'catalyst': ('social_hierarchy', 2, 4),
+    'helper': ('power_structures', 2, None),
+    'victim': ('social_hierarchy', -2, None),
+    'mentor': ('power_structures', 1, 3),
+}
+
+WORLD_CACHE_SIZE = 64
+CONTEXT_CACHE_SIZE = 256
 
 
 def load_story_data(story_key):
-    data_path = Path(__file__).parent / "data" / "stories.json"
-    with open(data_path, 'r', encoding='utf-8') as f:
-        stories = json.load(f)
+    stories = catalog.stories()
     
     if story_key not in stories:
-        available = list(stories.keys())
+        available = stories.keys()
         raise ValueError(f"Story '{story_key}' not found. Available: {available}")
     
-    return stories[story_key]
+    return stories.get(story_key)
 
 
 def load_world_data(world_key):
-    data_path = Path(__file__).parent / "data" / "worlds.json"
-    with open(data_path, 'r', encoding='utf-8') as f:
-        worlds = json.load(f)
+    worlds = catalog.worlds()
     
     if world_key not in worlds:
-        available = list(worlds.keys())
+        available = worlds.keys()
         raise ValueError(f"World '{world_key}' not found. Available: {available}")
     
-    return worlds[world_key]
+    return worlds.get(world_key)
+
+
+def list_story_keys():
+    return catalog.stories().keys()
+
+
+def list_world_keys():
+    return catalog.worlds().keys()
+
+
+def compile_role_table(world_data):
+    return {
+        role: world_data[field][start:stop]
+        for role, (field, start, stop) in ROLE_POSITION_SOURCES.items()
+    }
+
+
+@lru_cache(maxsize=WORLD_CACHE_SIZE)
+def compile_world(world_key):
+    """Per-world data shared by every context built for that world"""
+    world = load_world_data(world_key)
+    return {
+        'data': world,
+        'role_table': compile_role_table(world),
+        'target_world': {
+            'name': world['name'],
+            'era': world['era'],
+            'setting': world['setting'],
+            'aesthetic': world['aesthetic'],
+            'technology': world['technology_level']
+        }
+    }
 
 
-def map_character_to_world(character, world_data):
+def map_character_to_world(character, world_data, role_table=None):
     role = character['role']
     traits = character['traits']
     
-    role_mappings = {
-        'protagonist': world_data['social_hierarchy'][1:3],  
-        'antagonist': world_data['power_structures'][:2],   
-        'catalyst': world_data['social_hierarchy'][2:4],    
-        'helper': world_data['power_structures'][2:],       
-        'victim': world_data['social_hierarchy'][-2:],     
-        'mentor': world_data['power_structures'][1:3],   
-    }
+    if role_table is None:
+        role_table = compile_role_table(world_data)
     
-    suggested_positions = role_mappings.get(role, world_data['social_hierarchy'])
+    suggested_positions = role_table.get(role, world_data['social_hierarchy'])
     
     return {
         'original_name': character['name'],
@@ -78,13 +115,21 @@ def map_plot_beats_to_world(plot_beats, world_data):
     return mapped_beats
 
 
+@lru_cache(maxsize=CONTEXT_CACHE_SIZE)
 def create_transformation_context(story_key, world_key):
+    """Build (or reuse) the context for a story/world pair
+
+    Contexts are memoized and reference the shared world lists rather than
+    copying them, so callers must treat the result as read-only.
+    """
     story = load_story_data(story_key)
-    world = load_world_data(world_key)
+    compiled = compile_world(world_key)
+    world = compiled['data']
+    role_table = compiled['role_table']
     
     character_mappings = []
     for char in story['key_characters']:
-        mapping = map_character_to_world(char, world)
+        mapping = map_character_to_world(char, world, role_table)
         character_mappings.append(mapping)
     
     conflict_mapping = map_conflict_to_world(story['central_conflict'], world)
@@ -99,13 +144,7 @@ def create_transformation_context(story_key, world_key):
             'themes': story['core_themes'],
             'emotional_core': story['emotional_core']
         },
-        'target_world': {
-            'name': world['name'],
-            'era': world['era'],
-            'setting': world['setting'],
-            'aesthetic': world['aesthetic'],
-            'technology': world['technology_level']
-        },
+        'target_world': compiled['target_world'],
         'character_mappings': character_mappings,
         'conflict_mapping': conflict_mapping,
         'plot_structure': plot_mapping,